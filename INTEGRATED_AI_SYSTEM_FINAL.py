@@ -9,7 +9,7 @@ import sqlite3
 from datetime import datetime, timedelta
 import os
 import subprocess
-from MASS_SCRAPING_IMPLEMENTATION import HealthContentScraper
+from MASS_SCRAPING_IMPLEMENTATION import HealthContentScraper, run_sharded_crawl
 from PERSUASIVE_CONTENT_GENERATOR import PersuasiveContentGenerator
 
 class IntegratedAIContentSystem:
@@ -17,9 +17,11 @@ class IntegratedAIContentSystem:
     Complete AI system that scrapes, learns, and generates optimized content
     """
     
-    def __init__(self, workspace_dir="/workspace"):
+    def __init__(self, workspace_dir="/workspace", scrape_shards=1):
         self.workspace_dir = workspace_dir
         self.scraper = HealthContentScraper()
+        # With more than one shard, scraping runs in that many processes and merges into the scraper's database
+        self.scrape_shards = scrape_shards
         self.generator = PersuasiveContentGenerator()
         self.blog_dir = os.path.join(workspace_dir, "BlogGuru-main/blog/src/content/blog")
         self.insights_file = "content_insights.json"
@@ -44,7 +46,7 @@ class IntegratedAIContentSystem:
         # Step 1: Mass scraping and learning
         print("\n[1/4] Starting mass content scraping and analysis...")
         print("This will analyze thousands of health and wellness websites...")
-        await self.scraper.run_mass_scraping()
+        await self.scrape()
         
         # Step 2: Generate insights
         print("\n[2/4] Generating content intelligence insights...")
@@ -62,6 +64,14 @@ class IntegratedAIContentSystem:
         print("SYSTEM INITIALIZATION COMPLETE")
         print("=" * 60)
     
+    async def scrape(self):
+        """Run the scraper, sharded across processes when scrape_shards > 1"""
+        if self.scrape_shards > 1:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, run_sharded_crawl, self.scrape_shards, self.scraper.db_path)
+        else:
+            await self.scraper.run_mass_scraping()
+    
     def load_insights(self):
         """Load scraped insights into the generator"""
         if os.path.exists(self.insights_file):
@@ -261,7 +271,7 @@ Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
             print("WEEKLY CONTENT INTELLIGENCE UPDATE")
             print("=" * 60)
             
-            await self.scraper.run_mass_scraping()
+            await self.scrape()
             self.scraper.generate_insights()
             self.load_insights()
             
@@ -275,8 +285,8 @@ class AIOrchestrator:
     Orchestrates all AI employees and systems
     """
     
-    def __init__(self):
-        self.content_system = IntegratedAIContentSystem()
+    def __init__(self, scrape_shards=1):
+        self.content_system = IntegratedAIContentSystem(scrape_shards=scrape_shards)
     
     async def start_all_systems(self):
         """Start all AI systems"""
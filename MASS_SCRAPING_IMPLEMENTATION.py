@@ -5,26 +5,1979 @@ This system scrapes thousands of health and wellness websites to learn content s
 
 import asyncio
 import aiohttp
-from bs4 import BeautifulSoup
+from aiohttp import web
+from bs4 import BeautifulSoup, Tag
+from bs4.element import NavigableString, CData
+import soupsieve
 import json
 import sqlite3
-from datetime import datetime
+import hashlib
+import codecs
+import zlib
+import gzip
+import uuid
+import contextlib
+from datetime import datetime, timedelta
 import re
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urljoin, urlparse, urlsplit, parse_qsl, urlencode
 import time
-from collections import Counter
+import math
+import heapq
+import itertools
+import difflib
+import random
+from collections import Counter, deque
+from email.utils import parsedate_to_datetime
+from urllib.robotparser import RobotFileParser
+from xml.etree.ElementTree import XMLPullParser, ParseError
 import nltk
 from textblob import TextBlob
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
+import os
+import queue
+import threading
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Scraper copy installed in each parse worker process
+parse_worker_scraper = None
+
+def init_parse_worker(scraper):
+    """Install the scraper used by a parse worker process"""
+    global parse_worker_scraper
+    parse_worker_scraper = scraper
+
+def parse_worker_call(method_name, *args):
+    """Run a scraper parsing/analysis method inside a parse worker process"""
+    return getattr(parse_worker_scraper, method_name)(*args)
+
+def shard_for_host(host, shard_count):
+    """Shard that owns a host; stable across processes and machines"""
+    return zlib.crc32(host.encode('utf-8')) % shard_count
+
+def shard_db_path(db_path, shard_index, shard_count):
+    """Database a shard crawls into, next to the database the shards merge into"""
+    base, extension = os.path.splitext(db_path)
+    return f"{base}.shard-{shard_index}-of-{shard_count}{extension or '.db'}"
+
+def split_sentences(text):
+    """Split text into sentence tokens that join back into exactly the same text"""
+    return re.split(r'(?<=[.!?] )', text)
+
+def body_delta(new_text, old_text):
+    """
+    Compact delta that rebuilds old_text from new_text: a list of [start, end]
+    ranges of new_text's sentences to copy and literal strings to insert
+    """
+    new_tokens = split_sentences(new_text)
+    old_tokens = split_sentences(old_text)
+    delta = []
+    matcher = difflib.SequenceMatcher(None, new_tokens, old_tokens, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            delta.append([i1, i2])
+        elif j2 > j1:
+            delta.append(''.join(old_tokens[j1:j2]))
+    return delta
+
+def apply_body_delta(new_text, delta):
+    """Rebuild the older text a body_delta was made from"""
+    new_tokens = split_sentences(new_text)
+    return ''.join(
+        ''.join(new_tokens[op[0]:op[1]]) if isinstance(op, list) else op
+        for op in delta
+    )
+
+# Keyword candidates: lowercase words of four or more letters
+KEYWORD_PATTERN = r'\b[a-z]{4,}\b'
+
+# Common words long enough to match KEYWORD_PATTERN that never make useful keywords
+KEYWORD_STOP_WORDS = frozenset("""
+    about above after again against also been before being below between both cannot could
+    does doing down during each even every from further have having here hers herself himself
+    into itself just like made make many more most much must myself never only other ours
+    ourselves over same should some such than that their theirs them themselves then there
+    these they this those through under until very want well were what when where which while
+    whom will with within without would your yours yourself yourselves
+""".split())
+
+# Persuasion patterns analyze_content looks for in lowercased article text
+POWER_WORDS = [
+    'proven', 'guaranteed', 'exclusive', 'limited', 'secret',
+    'amazing', 'revolutionary', 'breakthrough', 'discover',
+    'transform', 'ultimate', 'essential', 'powerful', 'effective'
+]
+CTA_PATTERNS = [
+    r'click here',
+    r'learn more',
+    r'get started',
+    r'buy now',
+    r'shop now',
+    r'sign up',
+    r'subscribe',
+    r'download',
+    r'try now'
+]
+SOCIAL_PROOF_PATTERNS = [
+    r'\d+\s+(people|users|customers)',
+    r'testimonial',
+    r'review',
+    r'rated',
+    r'trusted by'
+]
+
+# Header naming the original URL on requests sent to a ReplayServer
+REPLAY_URL_HEADER = 'X-Replay-URL'
+
+# Headers describing the transfer rather than the (already decoded) body; not archived
+ARCHIVE_DROPPED_HEADERS = {'content-length', 'content-encoding', 'transfer-encoding', 'connection', 'keep-alive'}
+
+# WARC header keeping a truncated record's original Content-Length, so replay fails the same way
+ARCHIVE_LENGTH_HEADER = 'X-Original-Content-Length'
+
+# Strings inside these elements are not part of an element's text
+# (matches BeautifulSoup's get_text, so every parser backend agrees)
+NON_TEXT_TAGS = {'script', 'style', 'template', 'rt', 'rp'}
+
+# String classes BeautifulSoup's get_text reads from ordinary elements
+SOUP_TEXT_TYPES = (NavigableString, CData)
+
+# Page furniture that extract_content leaves out of the article body
+CONTENT_SKIP_TAGS = ('script', 'style', 'nav', 'footer', 'header')
+
+# Elements extract_article_data needs, gathered in a single walk
+HEADING_TAGS = ('h1', 'h2', 'h3', 'h4', 'h5', 'h6')
+SCAN_TAGS = ('a', 'img', 'title', 'meta') + HEADING_TAGS
+
+# URL patterns that usually mark an article page
+DEFAULT_ARTICLE_PATTERNS = [
+    r'/article/',
+    r'/blog/',
+    r'/post/',
+    r'/\d{4}/\d{2}/',  # Date-based URLs
+    r'/health/',
+    r'/fitness/',
+    r'/nutrition/',
+    r'/wellness/',
+]
+
+# Query parameters that only track the visitor and never change the page
+TRACKING_PARAMS = {'fbclid', 'gclid', 'dclid', 'msclkid', 'igshid', 'mc_cid', 'mc_eid', '_ga', 'ref', 'ref_src'}
+TRACKING_PARAM_PREFIXES = ('utm_',)
+
+# Links with these extensions are never HTML pages worth crawling
+NON_HTML_EXTENSIONS = ('.pdf', '.jpg', '.jpeg', '.png', '.gif', '.svg', '.webp', '.ico',
+                       '.css', '.js', '.xml', '.zip', '.mp3', '.mp4', '.mov')
+
+# SimHash bit counting: byte value b at position i of a 64-bit hash, spread into
+# eight 32-bit counter lanes (bits 8*i..8*i+7) of one 64-lane accumulator
+SIMHASH_LANES = [
+    [sum(((byte >> bit) & 1) << (32 * (8 * position + bit)) for bit in range(8)) for byte in range(256)]
+    for position in range(8)
+]
+
+# Namespace of sitemap.xml elements (https://www.sitemaps.org/protocol.html)
+SITEMAP_NS = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
+
+class SoupDocument:
+    """
+    Parsed page backed by BeautifulSoup with the given tree builder
+    ('html.parser' or 'lxml')
+    """
+    
+    def __init__(self, html, builder='lxml'):
+        self.soup = BeautifulSoup(html, builder)
+        self.root = self.soup
+    
+    def find(self, tag):
+        """First element with the tag name, or None"""
+        return self.soup.find(tag)
+    
+    def find_all(self, tag):
+        """All elements with the tag (or list of tags), in document order"""
+        return self.soup.find_all(tag)
+    
+    def select_one(self, selector, skip_tags=()):
+        """First element matching a CSS selector that is not inside a skip_tags subtree, or None"""
+        if not skip_tags:
+            return self.soup.select_one(selector)
+        for element in soupsieve.iselect(selector, self.soup):
+            if not self.in_subtree(element, skip_tags):
+                return element
+        return None
+    
+    def in_subtree(self, element, tags):
+        """True if the element or one of its ancestors has one of the tags"""
+        return element.name in tags or element.find_parent(tags) is not None
+    
+    def attr(self, element, name, default=None):
+        """Attribute value of an element"""
+        return element.get(name, default)
+    
+    def text(self, element, separator='', strip=False, skip_tags=()):
+        """Text of an element, like BeautifulSoup's get_text, leaving out skip_tags subtrees"""
+        if not skip_tags:
+            return element.get_text(separator=separator, strip=strip)
+        
+        strings = []
+        stack = [iter(element.contents)]
+        while stack:
+            for child in stack[-1]:
+                if isinstance(child, Tag):
+                    if child.name not in skip_tags and child.contents:
+                        stack.append(iter(child.contents))
+                        break
+                elif type(child) in SOUP_TEXT_TYPES:
+                    value = child.strip() if strip else str(child)
+                    if value or not strip:
+                        strings.append(value)
+            else:
+                stack.pop()
+        return separator.join(strings)
+    
+    def collect(self, tags, skip_tags):
+        """
+        Walk the tree once and return (tag, element, skipped) for every element
+        whose tag is in tags, in document order; skipped is True inside a skip_tags subtree
+        """
+        found = []
+        stack = [(iter(self.soup.contents), False)]
+        while stack:
+            children, skipped = stack[-1]
+            for child in children:
+                if not isinstance(child, Tag):
+                    continue
+                name = child.name
+                if name in tags:
+                    found.append((name, child, skipped))
+                if child.contents:
+                    stack.append((iter(child.contents), skipped or name in skip_tags))
+                    break
+            else:
+                stack.pop()
+        return found
+
+class LexborDocument:
+    """
+    Parsed page backed by selectolax's Lexbor engine (optional C parser)
+    """
+    
+    def __init__(self, html):
+        self.tree = LexborHTMLParser(html)
+        self.root = self.tree.root
+    
+    def find(self, tag):
+        """First element with the tag name, or None"""
+        return self.tree.css_first(tag)
+    
+    def find_all(self, tag):
+        """All elements with the tag (or list of tags), in document order"""
+        if isinstance(tag, (list, tuple)):
+            tag = ', '.join(tag)
+        return self.tree.css(tag)
+    
+    def select_one(self, selector, skip_tags=()):
+        """First element matching a CSS selector that is not inside a skip_tags subtree, or None"""
+        if not skip_tags:
+            return self.tree.css_first(selector)
+        for element in self.tree.css(selector):
+            if not self.in_subtree(element, skip_tags):
+                return element
+        return None
+    
+    def in_subtree(self, element, tags):
+        """True if the element or one of its ancestors has one of the tags"""
+        node = element
+        while node is not None:
+            if node.tag in tags:
+                return True
+            node = node.parent
+        return False
+    
+    def attr(self, element, name, default=None):
+        """Attribute value of an element"""
+        attributes = element.attributes
+        if name not in attributes:
+            return default
+        # Valueless attributes come back as None; BeautifulSoup reports ''
+        return attributes[name] or ''
+    
+    def text(self, element, separator='', strip=False, skip_tags=()):
+        """Text of an element, following the same rules as BeautifulSoup's get_text, leaving out skip_tags subtrees"""
+        strings = []
+        stack = [element.iter(include_text=True)]
+        while stack:
+            for node in stack[-1]:
+                if node.tag == '-text':
+                    value = node.text_content
+                    if strip:
+                        value = value.strip()
+                        if not value:
+                            continue
+                    strings.append(value)
+                elif node.is_element_node and node.tag not in NON_TEXT_TAGS and node.tag not in skip_tags:
+                    stack.append(node.iter(include_text=True))
+                    break
+            else:
+                stack.pop()
+        return separator.join(strings)
+    
+    def collect(self, tags, skip_tags):
+        """
+        Return (tag, element, skipped) for every element whose tag is in tags,
+        in document order; skipped is True inside a skip_tags subtree
+        """
+        # Lexbor's selector engine walks the tree in C, which beats a Python-level walk
+        selector = ', '.join(tags)
+        skipped_ids = set()
+        for container in self.find_all(skip_tags):
+            skipped_ids.update(element.mem_id for element in container.css(selector))
+        return [
+            (element.tag, element, element.mem_id in skipped_ids)
+            for element in self.tree.css(selector)
+        ]
+
+# Parser backends selectable with HealthContentScraper(parser_backend=...)
+PARSER_BACKENDS = {
+    'html.parser': lambda html: SoupDocument(html, 'html.parser'),
+    'lxml': lambda html: SoupDocument(html, 'lxml'),
+    'lexbor': LexborDocument,
+}
+
+# Words for lexicon sentiment scoring, split the way TextBlob splits them:
+# "don't" becomes "do" and "n't", "mobile-friendly" and "base.html" stay whole
+SENTIMENT_TOKEN = re.compile(r"\w+(?:[-./]\w+)*(?=n't)|n't|\w+(?:[-./]\w+)*|!")
+
+class TextBlobSentiment:
+    """TextBlob's pattern-based polarity over the raw text (the original analyzer)"""
+    
+    uses_words = False
+    
+    def polarity(self, text, words=None):
+        return TextBlob(text).sentiment.polarity
+
+class LexiconSentiment:
+    """
+    Polarity straight from a word lexicon over pre-tokenized, lowercased words:
+    the average of the known words' polarities, scaled by a preceding
+    intensifier ("very good"), boosted by a following "!" and reversed at half
+    strength after a negation ("not good"). The lexicon is TextBlob's, so
+    scores follow the textblob backend closely without its per-sentence parsing.
+    """
+    
+    uses_words = True
+    negations = frozenset(('no', 'not', "n't", 'never'))
+    
+    def __init__(self):
+        self.lexicon = None
+    
+    def load(self):
+        """word -> (polarity, intensity, is intensifier) from TextBlob's sentiment lexicon"""
+        from textblob.en import sentiment
+        sentiment.load()
+        self.lexicon = {
+            word: (senses[None][0], senses[None][2], any(pos in senses for pos in sentiment.modifiers))
+            for word, senses in sentiment.items() if None in senses
+        }
+    
+    def polarity(self, text, words=None):
+        if self.lexicon is None:
+            self.load()
+        if words is None:
+            words = SENTIMENT_TOKEN.findall(text.lower())
+        
+        scores = []                 # [polarity, intensity, negated] per known word
+        modifier = negation = False
+        for word in words:
+            entry = self.lexicon.get(word)
+            if entry is not None:
+                polarity, intensity, is_modifier = entry
+                if modifier and scores:
+                    scores[-1][0] = max(-1.0, min(polarity * scores[-1][1], 1.0))
+                    scores[-1][1] = intensity
+                else:
+                    scores.append([polarity, intensity, False])
+                if negation:
+                    scores[-1][1] = 1.0 / scores[-1][1]
+                    scores[-1][2] = True
+                modifier = is_modifier
+                negation = word in self.negations
+            else:
+                if word in self.negations:
+                    negation = True
+                elif negation and len(word) > 1:
+                    negation = False
+                if modifier and len(word) > 2:
+                    modifier = False
+                if word == '!' and scores:
+                    scores[-1][0] = max(-1.0, min(scores[-1][0] * 1.25, 1.0))
+        
+        if not scores:
+            return 0.0
+        return sum(polarity * -0.5 if negated else polarity for polarity, _, negated in scores) / len(scores)
+
+# Sentiment backends selectable with HealthContentScraper(sentiment_backend=...)
+SENTIMENT_BACKENDS = {
+    'textblob': TextBlobSentiment,
+    'lexicon': LexiconSentiment,
+}
+
+# Responses worth fetching again; other 4xx (404, 410, ...) are permanent failures
+RETRY_STATUSES = {408, 425, 429}
+
+class FetchError(Exception):
+    """A page fetch that failed; retryable failures (timeouts, resets, 5xx) may succeed later"""
+    
+    def __init__(self, message, retryable=False, status=None, error_class=None, retry_after=None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.status = status
+        # Seconds before another attempt can succeed, when known
+        self.retry_after = retry_after
+        # Short name for metrics: 'http_503', 'TimeoutError', 'unusable_body', ...
+        self.error_class = error_class or (f"http_{status}" if status else 'fetch_error')
+
+class Histogram:
+    """Durations in seconds in log-spaced buckets (each 10% wider than the last), with percentile estimates"""
+    
+    def __init__(self, smallest=0.0001, growth=1.1):
+        self.smallest = smallest
+        self.log_growth = math.log(growth)
+        self.buckets = {}       # bucket index -> count
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+    
+    def observe(self, value):
+        """Record one duration"""
+        index = 0 if value <= self.smallest else int(math.log(value / self.smallest) / self.log_growth) + 1
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+    
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction (0-1) of observations"""
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(self.max, self.smallest * math.exp(index * self.log_growth))
+        return self.max
+    
+    def summary(self):
+        """Count, mean and percentiles, in seconds"""
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': self.percentile(0.5),
+            'p90': self.percentile(0.9),
+            'p99': self.percentile(0.99),
+            'max': self.max,
+            'total': self.total,
+        }
+
+class CrawlMetrics:
+    """
+    Counters, throughput and timing histograms for one crawl, readable at any
+    time through snapshot(). Timings are keyed by stage (fetch, each parse task,
+    parse_slot_wait, db_batch); fetch latency is also kept per host.
+    """
+    
+    def __init__(self, window=60):
+        self.started = time.time()
+        self.window = window
+        self.counters = Counter()
+        self.errors = Counter()
+        self.statuses = Counter()
+        self.timings = {}           # stage -> Histogram
+        self.host_latency = {}      # host -> Histogram
+        self.recent = deque()       # [second, pages, bytes] for the last `window` seconds
+        self.parse_waiting = 0
+        self.parse_running = 0
+    
+    def increment(self, name, amount=1):
+        """Add to a named counter"""
+        self.counters[name] += amount
+    
+    def observe(self, stage, seconds):
+        """Record how long one unit of work took in a stage"""
+        histogram = self.timings.get(stage)
+        if histogram is None:
+            histogram = self.timings[stage] = Histogram()
+        histogram.observe(seconds)
+    
+    def record_fetch(self, host, status, seconds):
+        """Record a completed page fetch"""
+        self.statuses[status] += 1
+        self.counters['pages'] += 1
+        self.observe('fetch', seconds)
+        histogram = self.host_latency.get(host)
+        if histogram is None:
+            histogram = self.host_latency[host] = Histogram()
+        histogram.observe(seconds)
+        self.add_recent(1, 0)
+    
+    def record_bytes(self, count):
+        """Record body bytes received"""
+        self.counters['bytes'] += count
+        self.add_recent(0, count)
+    
+    def record_error(self, error_class):
+        """Count a failure by class"""
+        self.errors[error_class] += 1
+    
+    def add_recent(self, pages, size):
+        """Add to the per-second totals used for current throughput"""
+        second = int(time.time())
+        if self.recent and self.recent[-1][0] == second:
+            self.recent[-1][1] += pages
+            self.recent[-1][2] += size
+        else:
+            self.recent.append([second, pages, size])
+            while self.recent[0][0] <= second - self.window:
+                self.recent.popleft()
+    
+    def snapshot(self):
+        """Plain-dict view of every metric, ready for JSON"""
+        now = time.time()
+        elapsed = max(now - self.started, 1e-9)
+        recent = [entry for entry in self.recent if entry[0] > now - self.window]
+        span = min(self.window, elapsed)
+        return {
+            'timestamp': datetime.now().isoformat(),
+            'elapsed_seconds': elapsed,
+            'counters': dict(self.counters),
+            'throughput': {
+                'pages_per_sec': self.counters['pages'] / elapsed,
+                'bytes_per_sec': self.counters['bytes'] / elapsed,
+                'recent_pages_per_sec': sum(entry[1] for entry in recent) / span,
+                'recent_bytes_per_sec': sum(entry[2] for entry in recent) / span,
+            },
+            'statuses': {str(status): count for status, count in self.statuses.items()},
+            'errors': dict(self.errors),
+            'timings': {stage: histogram.summary() for stage, histogram in self.timings.items()},
+            'host_latency': {host: histogram.summary() for host, histogram in self.host_latency.items()},
+        }
+
+class HostRateLimiter:
+    """
+    Per-host token buckets whose refill rate adapts to how each host responds.
+    The rate creeps up while responses are healthy and fast, halves on 429/503
+    (honouring Retry-After), eases off on slow responses or errors, and never
+    exceeds the rate allowed by the host's robots.txt.
+    """
+    
+    def __init__(self, initial_rate=1.0, min_rate=0.05, max_rate=10.0, burst=2,
+                 rate_step=0.1, target_latency=2.0):
+        self.initial_rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.rate_step = rate_step
+        self.target_latency = target_latency
+        self.hosts = {}
+    
+    def host_state(self, host):
+        """Bucket state for a host, created on first use"""
+        state = self.hosts.get(host)
+        if state is None:
+            state = {
+                'rate': min(self.initial_rate, self.max_rate),
+                'max_rate': self.max_rate,
+                'burst': self.burst,
+                'tokens': 1.0,
+                'updated': time.time(),
+                'blocked_until': 0.0,
+            }
+            self.hosts[host] = state
+        return state
+    
+    def refill(self, state, now):
+        """Add the tokens earned since the last update"""
+        elapsed = max(0.0, now - state['updated'])
+        state['tokens'] = min(state['burst'], state['tokens'] + elapsed * state['rate'])
+        state['updated'] = now
+    
+    def ready_at(self, host, now):
+        """Time at which the next request to a host may start"""
+        state = self.host_state(host)
+        self.refill(state, now)
+        if state['blocked_until'] > now:
+            return state['blocked_until']
+        if state['tokens'] >= 1:
+            return now
+        return now + (1 - state['tokens']) / state['rate']
+    
+    def consume(self, host, now):
+        """Spend a token for a request that is starting now"""
+        state = self.host_state(host)
+        self.refill(state, now)
+        state['tokens'] -= 1
+    
+    def set_robots_delay(self, host, delay):
+        """Cap a host's rate at one request per robots.txt delay"""
+        state = self.host_state(host)
+        if delay and delay > 0:
+            state['max_rate'] = min(self.max_rate, 1.0 / delay)
+            state['burst'] = 1
+        else:
+            state['max_rate'] = self.max_rate
+            state['burst'] = self.burst
+        state['rate'] = min(state['rate'], state['max_rate'])
+    
+    def record_response(self, host, status, latency, retry_after=None):
+        """Adapt a host's rate to a finished request; status is None for network errors"""
+        state = self.host_state(host)
+        now = time.time()
+        
+        if status in (429, 503):
+            state['rate'] = max(self.min_rate, state['rate'] / 2)
+            state['tokens'] = min(state['tokens'], 0.0)
+            wait = self.parse_retry_after(retry_after, now)
+            if wait:
+                state['blocked_until'] = max(state['blocked_until'], now + wait)
+        elif status is None or status >= 500 or latency > self.target_latency:
+            state['rate'] = max(self.min_rate, state['rate'] * 0.75)
+        else:
+            state['rate'] = min(state['max_rate'], state['rate'] + self.rate_step)
+    
+    def parse_retry_after(self, value, now):
+        """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)"""
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - now)
+        except (TypeError, ValueError, IndexError):
+            return None
+
+class CrawlFrontier:
+    """
+    Shared URL frontier that hands work to crawl workers while respecting
+    a per-host concurrency limit and each host's rate limiter.
+    When given a db_path, every URL's state (queued, in_flight, done, failed)
+    is persisted so an interrupted crawl resumes where it stopped.
+    host_budget caps the article and page URLs queued per host in one crawl.
+    In a sharded crawl, URLs on hosts for which owns_host is false are passed
+    to handoff(url, kind, priority, depth) instead of being queued.
+    Given an ArticleWriter, state changes are batched through its thread so
+    the event loop never waits on a lock held by an article batch.
+    """
+    
+    def __init__(self, per_host_limit=2, rate_limiter=None, db_path=None, host_budget=None,
+                 owns_host=None, handoff=None, writer=None):
+        self.per_host_limit = per_host_limit
+        self.rate_limiter = rate_limiter or HostRateLimiter()
+        self.host_budget = host_budget
+        self.owns_host = owns_host
+        self.handoff = handoff
+        self.writer = writer
+        self.ready = {}          # host -> heap of (-priority, seq, url, kind, depth)
+        self.delayed = {}        # host -> heap of (next_eligible, seq, priority, url, kind, depth)
+        self.in_flight = {}      # host -> number of active requests
+        self.leased = {}         # url -> (priority, depth), for URLs handed to a worker
+        self.host_pages = {}     # host -> article and page URLs queued this crawl
+        self.seen = set()
+        self.finished = set()    # URLs done during this crawl, which revisit may queue again
+        self.revisits = {}       # url -> (kind, priority, depth) to queue again once its fetch ends
+        self.attempts = {}       # url -> fetch attempts so far, for URLs that failed at least once
+        self.active = 0
+        self.closed = False
+        self.sequence = itertools.count()
+        self.condition = asyncio.Condition()
+        
+        self.conn = None
+        if db_path:
+            self.conn = sqlite3.connect(db_path, timeout=60)
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            self.setup_table()
+    
+    def setup_table(self):
+        """Create the persistent frontier table"""
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS crawl_frontier (
+                url TEXT PRIMARY KEY,
+                kind TEXT,
+                host TEXT,
+                status TEXT,
+                priority INTEGER DEFAULT 0,
+                next_eligible REAL DEFAULT 0,
+                attempts INTEGER DEFAULT 0,
+                last_error TEXT,
+                updated_date TIMESTAMP,
+                depth INTEGER DEFAULT 0
+            )
+        ''')
+        
+        # Frontier tables from before the BFS crawl lack the depth column
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(crawl_frontier)')}
+        if 'depth' not in columns:
+            self.conn.execute('ALTER TABLE crawl_frontier ADD COLUMN depth INTEGER DEFAULT 0')
+        
+        self.conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_crawl_frontier_status
+            ON crawl_frontier (status, priority)
+        ''')
+        
+        # Failure ledger - kept across crawls so a later pass can retry just these URLs
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS crawl_failures (
+                url TEXT PRIMARY KEY,
+                kind TEXT,
+                host TEXT,
+                attempts INTEGER DEFAULT 0,
+                last_status INTEGER,
+                last_error TEXT,
+                retryable INTEGER,
+                first_failed TIMESTAMP,
+                last_failed TIMESTAMP
+            )
+        ''')
+        self.conn.commit()
+    
+    def execute(self, sql, params):
+        """Persist a state change: queued on the writer during a crawl, committed here otherwise"""
+        if self.conn is None:
+            return
+        
+        if self.writer is not None:
+            self.writer.submit(self.write_state, sql, params)
+        else:
+            self.conn.execute(sql, params)
+            self.conn.commit()
+    
+    def write_state(self, cursor, sql, params):
+        cursor.execute(sql, params)
+    
+    def record(self, url, status, error=None, next_eligible=None):
+        """Persist a state change for a URL"""
+        if next_eligible is None:
+            self.execute('''
+                UPDATE crawl_frontier SET status = ?, last_error = ?, updated_date = ?
+                WHERE url = ?
+            ''', (status, error, datetime.now(), url))
+        else:
+            self.execute('''
+                UPDATE crawl_frontier SET status = ?, last_error = ?, next_eligible = ?, updated_date = ?
+                WHERE url = ?
+            ''', (status, error, next_eligible, datetime.now(), url))
+    
+    def load(self, continue_crawl=False):
+        """
+        Restore unfinished work from the previous run; returns the number of URLs
+        resumed. With continue_crawl, the URLs the previous run finished stay seen
+        even when nothing is left queued, instead of starting a fresh pass.
+        """
+        if self.conn is None:
+            return 0
+        
+        # Anything that was mid-fetch when the process died goes back in the queue
+        self.conn.execute("UPDATE crawl_frontier SET status = 'queued' WHERE status = 'in_flight'")
+        
+        queued = self.conn.execute('''
+            SELECT url, kind, host, priority, next_eligible, attempts, depth
+            FROM crawl_frontier
+            WHERE status = 'queued'
+        ''').fetchall()
+        
+        if not queued and not continue_crawl:
+            # Previous crawl ran to completion - start a fresh pass
+            self.conn.execute("DELETE FROM crawl_frontier WHERE status IN ('done', 'failed')")
+            self.conn.commit()
+            return 0
+        
+        self.conn.commit()
+        for url, host, kind, status in self.conn.execute('SELECT url, host, kind, status FROM crawl_frontier'):
+            self.seen.add(url)
+            if status == 'done':
+                self.finished.add(url)
+            if kind in ('article', 'page'):
+                self.host_pages[host] = self.host_pages.get(host, 0) + 1
+        for url, kind, host, priority, next_eligible, attempts, depth in queued:
+            self.push(host, url, kind, priority, next_eligible or 0, depth or 0)
+            if attempts:
+                self.attempts[url] = attempts
+        
+        return len(queued)
+    
+    def push(self, host, url, kind, priority, next_eligible, depth=0):
+        """Place a URL on its host's ready or delayed heap"""
+        seq = next(self.sequence)
+        if next_eligible > time.time():
+            heapq.heappush(self.delayed.setdefault(host, []), (next_eligible, seq, priority, url, kind, depth))
+        else:
+            heapq.heappush(self.ready.setdefault(host, []), (-priority, seq, url, kind, depth))
+    
+    async def put(self, url, kind='article', priority=0, next_eligible=0, depth=0):
+        """Queue a URL unless it was already seen during this crawl or its host's budget is spent"""
+        if url in self.seen:
+            return False
+        
+        host = urlparse(url).netloc
+        if self.owns_host is not None and not self.owns_host(host):
+            self.seen.add(url)
+            self.handoff(url, kind, priority, depth)
+            return False
+        
+        if kind in ('article', 'page'):
+            if self.host_budget is not None and self.host_pages.get(host, 0) >= self.host_budget:
+                return False
+            self.host_pages[host] = self.host_pages.get(host, 0) + 1
+        self.seen.add(url)
+        
+        self.execute('''
+            INSERT OR IGNORE INTO crawl_frontier
+            (url, kind, host, status, priority, next_eligible, depth, updated_date)
+            VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)
+        ''', (url, kind, host, priority, next_eligible, depth, datetime.now()))
+        
+        async with self.condition:
+            self.push(host, url, kind, priority, next_eligible, depth)
+            self.condition.notify()
+        return True
+    
+    async def revisit(self, url, kind='article', priority=0, depth=0):
+        """
+        Queue a URL finished earlier in this crawl once more, or again when its
+        current fetch ends; URLs not yet fetched are left alone
+        """
+        if url in self.leased:
+            self.revisits[url] = (kind, priority, depth)
+            return True
+        if url not in self.finished:
+            return False
+        self.finished.discard(url)
+        
+        self.record_revisit(url, priority)
+        async with self.condition:
+            self.push(urlparse(url).netloc, url, kind, priority, 0, depth)
+            self.condition.notify()
+        return True
+    
+    def record_revisit(self, url, priority):
+        """Persist a URL going back in the queue for revisit"""
+        self.execute('''
+            UPDATE crawl_frontier SET status = 'queued', priority = ?, next_eligible = 0, updated_date = ?
+            WHERE url = ?
+        ''', (priority, datetime.now(), url))
+    
+    def next_ready_host(self, now):
+        """Return (host, None) for a host that may be fetched now, or (None, seconds to wait)"""
+        wait = None
+        for host in set(self.ready) | set(self.delayed):
+            # Promote URLs whose next-eligible time has passed
+            delayed = self.delayed.get(host)
+            while delayed and delayed[0][0] <= now:
+                _, seq, priority, url, kind, depth = heapq.heappop(delayed)
+                heapq.heappush(self.ready.setdefault(host, []), (-priority, seq, url, kind, depth))
+            
+            if self.in_flight.get(host, 0) >= self.per_host_limit:
+                continue
+            
+            if self.ready.get(host):
+                delay = self.rate_limiter.ready_at(host, now) - now
+            elif delayed:
+                delay = delayed[0][0] - now
+            else:
+                continue
+            
+            if delay <= 0:
+                return host, None
+            if wait is None or delay < wait:
+                wait = delay
+        return None, wait
+    
+    async def get(self):
+        """Wait for the next eligible (url, kind, depth); returns None once the crawl is finished"""
+        async with self.condition:
+            while True:
+                if self.closed:
+                    return None
+                
+                host, wait = self.next_ready_host(time.time())
+                if host is not None:
+                    neg_priority, _, url, kind, depth = heapq.heappop(self.ready[host])
+                    self.leased[url] = (-neg_priority, depth)
+                    self.in_flight[host] = self.in_flight.get(host, 0) + 1
+                    self.rate_limiter.consume(host, time.time())
+                    self.active += 1
+                    self.record(url, 'in_flight')
+                    return url, kind, depth
+                
+                if self.active == 0 and wait is None:
+                    # Nothing queued and nothing running - the crawl is complete
+                    self.closed = True
+                    self.condition.notify_all()
+                    return None
+                
+                try:
+                    await asyncio.wait_for(self.condition.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+    
+    async def task_done(self, url, status='done', error=None):
+        """Release the host slot held by a finished URL and record its outcome"""
+        host = urlparse(url).netloc
+        self.leased.pop(url, None)
+        self.attempts.pop(url, None)
+        revisit = self.revisits.pop(url, None)
+        if status == 'done':
+            self.clear_failure(url)
+            if revisit is None:
+                self.finished.add(url)
+        if revisit is not None:
+            kind, priority, depth = revisit
+            self.record_revisit(url, priority)
+        else:
+            self.record(url, status, error)
+        async with self.condition:
+            if revisit is not None:
+                self.push(host, url, kind, priority, 0, depth)
+            self.in_flight[host] -= 1
+            self.active -= 1
+            self.condition.notify_all()
+    
+    async def retry(self, url, kind, error, delay):
+        """Release a failed URL's host slot and queue it again after delay seconds"""
+        host = urlparse(url).netloc
+        priority, depth = self.leased.pop(url, (0, 0))
+        next_eligible = time.time() + delay
+        self.attempts[url] = self.attempts.get(url, 0) + 1
+        self.execute('''
+            UPDATE crawl_frontier
+            SET status = 'queued', attempts = ?, last_error = ?, next_eligible = ?, updated_date = ?
+            WHERE url = ?
+        ''', (self.attempts[url], error, next_eligible, datetime.now(), url))
+        
+        async with self.condition:
+            self.push(host, url, kind, priority, next_eligible, depth)
+            self.in_flight[host] -= 1
+            self.active -= 1
+            self.condition.notify_all()
+    
+    def record_failure(self, url, kind, error, status=None, retryable=False):
+        """Add a URL that gave up to the failure ledger"""
+        now = datetime.now()
+        self.execute('''
+            INSERT INTO crawl_failures
+            (url, kind, host, attempts, last_status, last_error, retryable, first_failed, last_failed)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(url) DO UPDATE SET
+                attempts = attempts + excluded.attempts,
+                last_status = excluded.last_status,
+                last_error = excluded.last_error,
+                retryable = excluded.retryable,
+                last_failed = excluded.last_failed
+        ''', (url, kind, urlparse(url).netloc, self.attempts.get(url, 0) + 1,
+              status, error, int(retryable), now, now))
+    
+    def clear_failure(self, url):
+        """Drop a URL from the failure ledger once it has been fetched"""
+        self.execute('DELETE FROM crawl_failures WHERE url = ?', (url,))
+    
+    def failed_urls(self):
+        """(url, kind) for every ledger entry worth another attempt"""
+        if self.conn is None:
+            return []
+        return self.conn.execute(
+            'SELECT url, kind FROM crawl_failures WHERE retryable = 1 ORDER BY last_failed'
+        ).fetchall()
+    
+    async def stop(self):
+        """End the crawl early; queued URLs stay in the table for the next run"""
+        async with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+    
+    def pending_count(self):
+        """Number of URLs still waiting to be fetched"""
+        return sum(len(heap) for heap in self.ready.values()) + sum(len(heap) for heap in self.delayed.values())
+    
+    def close(self):
+        """Close the frontier's database connection"""
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+class ShardHandoff:
+    """
+    URLs one crawl shard discovered on hosts another shard owns, kept in a
+    SQLite database every shard can open (a local file, or a network share
+    when shards run on several machines). Sends are buffered until flush().
+    """
+    
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.pending = []
+        # Default rollback journal: WAL does not work on network filesystems
+        self.conn = sqlite3.connect(db_path, timeout=60)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS shard_handoff (
+                url TEXT PRIMARY KEY,
+                shard INTEGER,
+                kind TEXT,
+                priority INTEGER,
+                depth INTEGER,
+                created_date TIMESTAMP
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_shard_handoff_shard ON shard_handoff (shard)')
+        self.conn.commit()
+    
+    def send(self, shard, url, kind, priority, depth):
+        """Buffer a URL for the shard that owns it"""
+        self.pending.append((url, shard, kind, priority, depth, datetime.now()))
+    
+    def flush(self):
+        """Write buffered URLs in one transaction"""
+        if not self.pending:
+            return
+        self.conn.executemany('''
+            INSERT OR IGNORE INTO shard_handoff (url, shard, kind, priority, depth, created_date)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', self.pending)
+        self.conn.commit()
+        self.pending = []
+    
+    def receive(self, shard):
+        """Take every URL handed to a shard; returns (url, kind, priority, depth) rows"""
+        # Lock out other shards' sends between the read and the delete
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = self.conn.execute(
+                'SELECT url, kind, priority, depth FROM shard_handoff WHERE shard = ?', (shard,)
+            ).fetchall()
+            self.conn.execute('DELETE FROM shard_handoff WHERE shard = ?', (shard,))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return rows
+    
+    def waiting_shards(self):
+        """Shards with handed-off URLs they have not picked up yet"""
+        return {row[0] for row in self.conn.execute('SELECT DISTINCT shard FROM shard_handoff')}
+    
+    def close(self):
+        """Flush and close the connection"""
+        self.flush()
+        self.conn.close()
+
+class RecordingStream:
+    """Response body stream that keeps a copy of every chunk the crawler reads"""
+    
+    def __init__(self, stream):
+        self.stream = stream
+        self.chunks = []
+    
+    async def read(self, n=-1):
+        data = await self.stream.read(n)
+        self.chunks.append(data)
+        return data
+    
+    async def iter_chunked(self, n):
+        async for chunk in self.stream.iter_chunked(n):
+            self.chunks.append(chunk)
+            yield chunk
+    
+    def at_eof(self):
+        return self.stream.at_eof()
+
+class RecordingResponse:
+    """An aiohttp response whose body reads are copied for a ResponseArchive"""
+    
+    def __init__(self, response):
+        self.response = response
+        self.content = RecordingStream(response.content)
+    
+    def __getattr__(self, name):
+        return getattr(self.response, name)
+
+class ResponseArchive:
+    """
+    Fetched responses as WARC/1.0 'response' records, one gzip member per
+    record (the usual .warc.gz layout), filed under the URL the crawler asked
+    for. Bodies are stored as the crawler received them, after aiohttp undid
+    any Content-Encoding, and only as far as the crawler read them; records
+    cut short that way carry a WARC-Truncated header and, when the server
+    sent one, the response's original Content-Length.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.responses = {}
+    
+    def record(self, url, response):
+        """Append a RecordingResponse to the archive"""
+        if self.file is None:
+            self.file = open(self.path, 'ab')
+        
+        body = b''.join(response.content.chunks)
+        status_line = f"HTTP/1.1 {response.status} {response.reason or ''}\r\n"
+        headers = ''.join(
+            f"{name}: {value}\r\n" for name, value in response.headers.items()
+            if name.lower() not in ARCHIVE_DROPPED_HEADERS
+        )
+        block = f"{status_line}{headers}Content-Length: {len(body)}\r\n\r\n".encode('utf-8', errors='replace') + body
+        
+        warc_headers = [
+            "WARC/1.0",
+            "WARC-Type: response",
+            f"WARC-Record-ID: <urn:uuid:{uuid.uuid4()}>",
+            f"WARC-Date: {time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())}",
+            f"WARC-Target-URI: {url}",
+            "Content-Type: application/http; msgtype=response",
+        ]
+        if not response.content.at_eof():
+            warc_headers.append("WARC-Truncated: length")
+            if response.content_length is not None:
+                warc_headers.append(f"{ARCHIVE_LENGTH_HEADER}: {response.content_length}")
+        warc_headers.append(f"Content-Length: {len(block)}")
+        record = ('\r\n'.join(warc_headers) + '\r\n\r\n').encode('utf-8') + block + b'\r\n\r\n'
+        self.file.write(gzip.compress(record))
+    
+    def load(self):
+        """
+        Read every response record into self.responses, keyed by URL, as
+        (status, reason, [(header, value), ...], body, truncated_length). Later
+        records win. truncated_length is None for complete records; for
+        truncated ones it is a Content-Length longer than the stored body.
+        """
+        with gzip.open(self.path, 'rb') as f:
+            while True:
+                line = f.readline()
+                if not line:
+                    break
+                if not line.startswith(b'WARC/'):
+                    continue
+                
+                warc_headers = {}
+                for line in iter(f.readline, b'\r\n'):
+                    name, _, value = line.decode('utf-8').partition(':')
+                    warc_headers[name.strip().lower()] = value.strip()
+                block = f.read(int(warc_headers['content-length']))
+                if warc_headers.get('warc-type') != 'response':
+                    continue
+                
+                head, _, body = block.partition(b'\r\n\r\n')
+                lines = head.decode('utf-8', errors='replace').split('\r\n')
+                _, status, reason = (lines[0].split(' ', 2) + [''])[:3]
+                headers = []
+                for line in lines[1:]:
+                    name, _, value = line.partition(':')
+                    if name.lower() != 'content-length':
+                        headers.append((name.strip(), value.strip()))
+                truncated_length = None
+                if 'warc-truncated' in warc_headers:
+                    truncated_length = max(int(warc_headers.get(ARCHIVE_LENGTH_HEADER.lower(), 0)), len(body) + 1)
+                self.responses[warc_headers['warc-target-uri']] = (int(status), reason, headers, body,
+                                                                   truncated_length)
+        return len(self.responses)
+    
+    def close(self):
+        """Close the archive file after recording"""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+class ReplayServer:
+    """
+    Local aiohttp server answering crawler requests from a loaded ResponseArchive,
+    for offline, repeatable benchmarks. The crawler names the URL it wants in the
+    X-Replay-URL header. Records truncated when they were recorded are sent
+    with their original Content-Length and the connection is dropped after the
+    stored body, so the crawler fails on them as it did live. Every response is
+    delayed by latency seconds plus up to latency_jitter; error_rate of requests
+    get one of error_statuses instead and disconnect_rate have their body cut
+    off halfway. seed makes the injected latency and faults repeatable.
+    """
+    
+    def __init__(self, archive, host='127.0.0.1', port=0, latency=0.0, latency_jitter=0.0,
+                 error_rate=0.0, error_statuses=(500, 503), disconnect_rate=0.0, seed=None):
+        self.archive = archive
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses
+        self.disconnect_rate = disconnect_rate
+        self.random = random.Random(seed)
+        self.runner = None
+        self.url = None
+        self.stats = Counter()
+    
+    async def start(self):
+        """Start serving; returns the server's base URL"""
+        app = web.Application()
+        app.router.add_route('GET', '/{tail:.*}', self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        self.url = f"http://{self.host}:{self.runner.addresses[0][1]}"
+        return self.url
+    
+    async def stop(self):
+        """Shut the server down"""
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+    
+    async def handle(self, request):
+        """Serve one archived response, with injected latency and faults"""
+        self.stats['requests'] += 1
+        delay = self.latency + self.random.uniform(0, self.latency_jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        
+        record = self.archive.responses.get(request.headers.get(REPLAY_URL_HEADER))
+        if record is None:
+            self.stats['not_archived'] += 1
+            return web.Response(status=404)
+        if self.random.random() < self.error_rate:
+            self.stats['injected_errors'] += 1
+            return web.Response(status=self.random.choice(self.error_statuses))
+        
+        status, reason, headers, body, truncated_length = record
+        if status == 200 and self.not_modified(request, headers):
+            self.stats['not_modified'] += 1
+            return web.Response(status=304)
+        
+        response = web.StreamResponse(status=status, reason=reason or None, headers=headers)
+        response.content_length = truncated_length or len(body)
+        await response.prepare(request)
+        if body and self.random.random() < self.disconnect_rate:
+            self.stats['disconnects'] += 1
+            await response.write(body[:len(body) // 2])
+            request.transport.close()
+            return response
+        await response.write(body)
+        if truncated_length is not None:
+            self.stats['truncated'] += 1
+            request.transport.close()
+            return response
+        await response.write_eof()
+        return response
+    
+    def not_modified(self, request, headers):
+        """True if the request's validators match the archived response's"""
+        archived = {name.lower(): value for name, value in headers}
+        etag = request.headers.get('If-None-Match')
+        if etag is not None:
+            return etag == archived.get('etag')
+        modified_since = request.headers.get('If-Modified-Since')
+        return modified_since is not None and modified_since == archived.get('last-modified')
+
+class ArticleWriter:
+    """
+    Background thread that owns a single SQLite connection (WAL mode) and
+    applies queued writes in batched transactions. Each queued write is a
+    function called as write_func(cursor, *args) inside the batch.
+    """
+    
+    def __init__(self, db_path, batch_size=100, flush_interval=2.0, metrics=None):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.metrics = metrics
+        self.queue = queue.Queue()
+        self.thread = None
+    
+    def start(self):
+        """Start the writer thread"""
+        self.thread = threading.Thread(target=self.run, name='article-writer', daemon=True)
+        self.thread.start()
+    
+    def submit(self, write_func, *args):
+        """Queue a write for the next batch"""
+        self.queue.put((write_func, args))
+    
+    def stop(self):
+        """Flush everything still queued, then close the connection"""
+        if self.thread is None:
+            return
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+    
+    def run(self):
+        """Drain the queue, committing when the batch is full or the flush interval passes"""
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        stopping = False
+        try:
+            while not stopping:
+                try:
+                    item = self.queue.get(timeout=max(0, deadline - time.monotonic()))
+                    if item is None:
+                        stopping = True
+                    else:
+                        batch.append(item)
+                except queue.Empty:
+                    pass
+                
+                if stopping or len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                    self.flush(conn, batch)
+                    batch = []
+                    deadline = time.monotonic() + self.flush_interval
+        finally:
+            conn.close()
+    
+    def flush(self, conn, batch):
+        """Write a batch in one transaction; a failing write only rolls back itself"""
+        if not batch:
+            return
+        
+        started = time.monotonic()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN')
+            for write_func, args in batch:
+                cursor.execute('SAVEPOINT write')
+                try:
+                    write_func(cursor, *args)
+                    cursor.execute('RELEASE write')
+                except Exception as e:
+                    print(f"Error in database write {write_func.__name__}: {str(e)}")
+                    cursor.execute('ROLLBACK TO write')
+                    cursor.execute('RELEASE write')
+            cursor.execute('COMMIT')
+        except Exception as e:
+            print(f"Error writing batch of {len(batch)}: {str(e)}")
+            if conn.in_transaction:
+                cursor.execute('ROLLBACK')
+        
+        if self.metrics is not None:
+            self.metrics.observe('db_batch', time.monotonic() - started)
+            self.metrics.increment('db_writes', len(batch))
+
+class KeywordIndex:
+    """
+    Inverted index from terms to the articles using them. Postings live in the
+    keywords table, one per term and article: its count, its term frequency
+    (count over the article's total terms) and when the term first appeared in
+    the article. term_stats holds each term's document frequency. Postings are
+    rewritten in the same transaction as their article, and only for terms
+    whose counts changed, so TF-IDF scores and term queries stay index lookups.
+    """
+    
+    def setup_tables(self, cursor):
+        """Create term_stats and the posting columns and indexes"""
+        existing_columns = {row[1] for row in cursor.execute('PRAGMA table_info(keywords)')}
+        for column, column_type in (('tf', 'REAL'), ('added_date', 'TIMESTAMP')):
+            if column not in existing_columns:
+                cursor.execute(f'ALTER TABLE keywords ADD COLUMN {column} {column_type}')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_keywords_article ON keywords (article_id, keyword)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_keywords_term ON keywords (keyword, tf)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_keywords_added ON keywords (added_date, keyword)')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS term_stats (
+                term TEXT PRIMARY KEY,
+                document_frequency INTEGER
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_term_stats_frequency ON term_stats (document_frequency)')
+    
+    def write(self, cursor, article_id, term_counts, added_date):
+        """Bring an article's postings and the document frequencies up to date with its term counts"""
+        old = dict(cursor.execute('SELECT keyword, frequency FROM keywords WHERE article_id = ?', (article_id,)))
+        old_total = sum(old.values())
+        total = sum(term_counts.values())
+        
+        removed = [(article_id, term) for term in old if term not in term_counts]
+        cursor.executemany('DELETE FROM keywords WHERE article_id = ? AND keyword = ?', removed)
+        cursor.executemany(
+            'UPDATE term_stats SET document_frequency = document_frequency - 1 WHERE term = ?',
+            [(term,) for _, term in removed]
+        )
+        cursor.executemany(
+            'DELETE FROM term_stats WHERE term = ? AND document_frequency <= 0', [(term,) for _, term in removed]
+        )
+        
+        # A new total changes every term frequency; otherwise only changed counts need updating
+        cursor.executemany(
+            'UPDATE keywords SET frequency = ?, tf = ? WHERE article_id = ? AND keyword = ?',
+            [(count, count / total, article_id, term) for term, count in term_counts.items()
+             if term in old and (old[term] != count or old_total != total)]
+        )
+        
+        added = [term for term in term_counts if term not in old]
+        self.insert_postings(cursor, article_id, {term: term_counts[term] for term in added}, total, added_date)
+        cursor.executemany('''
+            INSERT INTO term_stats (term, document_frequency) VALUES (?, 1)
+            ON CONFLICT (term) DO UPDATE SET document_frequency = document_frequency + 1
+        ''', [(term,) for term in added])
+    
+    def insert_postings(self, cursor, article_id, term_counts, total, added_date):
+        """Add postings without touching term_stats"""
+        cursor.executemany(
+            'INSERT INTO keywords (keyword, frequency, tf, added_date, article_id) VALUES (?, ?, ?, ?, ?)',
+            [(term, count, count / total, added_date, article_id) for term, count in term_counts.items()]
+        )
+    
+    def rebuild_stats(self, conn):
+        """Recount every term's document frequency from the postings"""
+        conn.execute('DELETE FROM term_stats')
+        conn.execute('''
+            INSERT INTO term_stats (term, document_frequency)
+            SELECT keyword, COUNT(*) FROM keywords GROUP BY keyword
+        ''')
+    
+    def idf(self, document_frequency, document_count):
+        """Smoothed inverse document frequency"""
+        return math.log((1 + document_count) / (1 + document_frequency)) + 1
+    
+    def document_count(self, conn):
+        return conn.execute('SELECT COUNT(*) FROM articles').fetchone()[0]
+    
+    def article_keywords(self, conn, article_id, top_k=20):
+        """An article's top_k (term, tf-idf) pairs, best first"""
+        document_count = self.document_count(conn)
+        scored = [
+            (term, tf * self.idf(document_frequency, document_count))
+            for term, tf, document_frequency in conn.execute('''
+                SELECT k.keyword, k.tf, t.document_frequency
+                FROM keywords k JOIN term_stats t ON t.term = k.keyword
+                WHERE k.article_id = ?
+            ''', (article_id,))
+        ]
+        return heapq.nsmallest(top_k, scored, key=lambda item: (-item[1], item[0]))
+    
+    def top_articles(self, conn, term, limit=10):
+        """(url, title, tf-idf) of the articles where a term weighs most"""
+        row = conn.execute('SELECT document_frequency FROM term_stats WHERE term = ?', (term,)).fetchone()
+        if row is None:
+            return []
+        idf = self.idf(row[0], self.document_count(conn))
+        return [
+            (url, title, tf * idf)
+            for url, title, tf in conn.execute('''
+                SELECT a.url, a.title, k.tf
+                FROM keywords k JOIN articles a ON a.id = k.article_id
+                WHERE k.keyword = ?
+                ORDER BY k.tf DESC
+                LIMIT ?
+            ''', (term, limit))
+        ]
+    
+    def top_terms(self, conn, limit=100):
+        """(term, document frequency) of the terms in the most articles"""
+        return conn.execute(
+            'SELECT term, document_frequency FROM term_stats ORDER BY document_frequency DESC LIMIT ?', (limit,)
+        ).fetchall()
+    
+    def rising_terms(self, conn, days=7, limit=20, min_articles=3):
+        """
+        Terms that appeared in more articles in the last `days` days than in
+        the period before: (term, articles now, articles before), fastest growing first
+        """
+        now = datetime.now()
+        recent_start = now - timedelta(days=days)
+        rows = conn.execute('''
+            SELECT keyword, SUM(added_date >= ?), SUM(added_date < ?)
+            FROM keywords WHERE added_date >= ?
+            GROUP BY keyword
+        ''', (recent_start, recent_start, recent_start - timedelta(days=days))).fetchall()
+        rising = [row for row in rows if row[1] >= min_articles and row[1] > row[2]]
+        rising.sort(key=lambda row: (-(row[1] + 1) / (row[2] + 1), -row[1], row[0]))
+        return rising[:limit]
+
+class ContentStore:
+    """
+    Article bodies compressed with zstd (zlib when zstandard is not installed),
+    optionally against a shared dictionary trained on stored bodies. Bodies
+    live in the article_bodies table keyed by article id, so queries on
+    articles never read them; dictionaries are kept forever because bodies
+    reference the one they were compressed with.
+    """
+    
+    def __init__(self, codec=None, level=None):
+        if codec is None:
+            codec = 'zstd' if zstandard is not None else 'zlib'
+        if codec not in ('zstd', 'zlib'):
+            raise ValueError(f"Unknown content codec: {codec}")
+        if codec == 'zstd' and zstandard is None:
+            print("zstandard is not installed, compressing article bodies with zlib")
+            codec = 'zlib'
+        self.codec = codec
+        self.level = level if level is not None else (9 if codec == 'zstd' else 6)
+        self.dictionary_id = None
+        self.dictionaries = {}      # dictionary id -> bytes
+        self.compressor = None
+        self.decompressors = {}     # (codec, dictionary id) -> zstd decompressor
+    
+    def __getstate__(self):
+        """zstd (de)compressors cannot be pickled; they are rebuilt on first use"""
+        state = self.__dict__.copy()
+        state['compressor'] = None
+        state['decompressors'] = {}
+        return state
+    
+    def setup_tables(self, cursor):
+        """Create the body and dictionary tables"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS article_bodies (
+                article_id INTEGER PRIMARY KEY,
+                codec TEXT,
+                dictionary_id INTEGER,
+                raw_size INTEGER,
+                body BLOB
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS content_dictionaries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                codec TEXT,
+                data BLOB,
+                created_date TIMESTAMP
+            )
+        ''')
+    
+    def load(self, conn):
+        """Use the newest dictionary trained for this codec"""
+        row = conn.execute(
+            'SELECT id, data FROM content_dictionaries WHERE codec = ? ORDER BY id DESC LIMIT 1',
+            (self.codec,)
+        ).fetchone()
+        if row is not None:
+            self.dictionary_id = row[0]
+            self.dictionaries[row[0]] = row[1]
+            self.compressor = None
+    
+    def dictionary(self, conn, dictionary_id):
+        """Bytes of a stored dictionary, cached after the first read"""
+        if dictionary_id not in self.dictionaries:
+            row = conn.execute('SELECT data FROM content_dictionaries WHERE id = ?', (dictionary_id,)).fetchone()
+            self.dictionaries[dictionary_id] = row[0]
+        return self.dictionaries[dictionary_id]
+    
+    def compress(self, text):
+        """(dictionary id, compressed bytes) for a body"""
+        data = text.encode('utf-8')
+        dictionary = self.dictionaries.get(self.dictionary_id)
+        if self.codec == 'zstd':
+            if self.compressor is None:
+                dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+                self.compressor = zstandard.ZstdCompressor(level=self.level, dict_data=dict_data)
+            return self.dictionary_id, self.compressor.compress(data)
+        
+        compressor = zlib.compressobj(self.level, zdict=dictionary) if dictionary else zlib.compressobj(self.level)
+        return self.dictionary_id, compressor.compress(data) + compressor.flush()
+    
+    def decompress(self, conn, codec, dictionary_id, body):
+        """Text of a stored body"""
+        dictionary = self.dictionary(conn, dictionary_id) if dictionary_id is not None else None
+        if codec == 'zstd':
+            if zstandard is None:
+                raise RuntimeError("zstandard is required to read zstd-compressed article bodies")
+            key = (codec, dictionary_id)
+            if key not in self.decompressors:
+                dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+                self.decompressors[key] = zstandard.ZstdDecompressor(dict_data=dict_data)
+            data = self.decompressors[key].decompress(body)
+        else:
+            decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+            data = decompressor.decompress(body) + decompressor.flush()
+        return data.decode('utf-8')
+    
+    def write(self, cursor, article_id, text):
+        """Store (or replace) an article's body"""
+        dictionary_id, body = self.compress(text)
+        cursor.execute('''
+            INSERT OR REPLACE INTO article_bodies (article_id, codec, dictionary_id, raw_size, body)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (article_id, self.codec, dictionary_id, len(text), body))
+    
+    def read(self, conn, article_id):
+        """An article's body, or None if it has none in the store"""
+        row = conn.execute(
+            'SELECT codec, dictionary_id, body FROM article_bodies WHERE article_id = ?',
+            (article_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return self.decompress(conn, *row)
+    
+    def train(self, conn, samples, dict_size=112640):
+        """Train a dictionary on sample bodies, store it and use it for new bodies; returns its id"""
+        encoded = [sample.encode('utf-8') for sample in samples if sample]
+        if self.codec == 'zstd':
+            data = zstandard.train_dictionary(dict_size, encoded).as_bytes()
+        else:
+            data = self.phrase_dictionary(encoded, min(dict_size, 32 * 1024))
+        
+        cursor = conn.execute(
+            'INSERT INTO content_dictionaries (codec, data, created_date) VALUES (?, ?, ?)',
+            (self.codec, data, datetime.now())
+        )
+        conn.commit()
+        self.dictionary_id = cursor.lastrowid
+        self.dictionaries[self.dictionary_id] = data
+        self.compressor = None
+        return self.dictionary_id
+    
+    def phrase_dictionary(self, samples, size):
+        """zlib preset dictionary: the phrases shared by most samples, most common last (closest to the data)"""
+        phrases = Counter()
+        for sample in samples:
+            words = sample.split()
+            phrases.update({b' '.join(words[i:i + 6]) for i in range(0, max(len(words) - 5, 0), 3)})
+        
+        chosen = []
+        used = 0
+        for phrase, count in phrases.most_common():
+            if count < 2 or used + len(phrase) + 1 > size:
+                break
+            chosen.append(phrase)
+            used += len(phrase) + 1
+        return b' '.join(reversed(chosen))
+
+class DuplicateIndex:
+    """
+    In-memory index of article body fingerprints: an exact hash of the
+    normalized text and a 64-bit SimHash. SimHashes are split into four
+    16-bit bands, so any two within max_distance (< 4) bits share a band.
+    """
+    
+    def __init__(self, max_distance=3):
+        if not 0 <= max_distance < 4:
+            raise ValueError("max_distance must be between 0 and 3")
+        self.max_distance = max_distance
+        self.exact = {}                          # body_hash -> url
+        self.bands = [{} for _ in range(4)]      # band value -> {url: simhash}
+        self.fingerprints = {}                   # url -> (body_hash, simhash)
+    
+    def load(self, db_path):
+        """Index every fingerprint stored in the database"""
+        conn = sqlite3.connect(db_path)
+        try:
+            for url, body_hash, simhash in conn.execute('SELECT url, body_hash, simhash FROM content_fingerprints'):
+                self.add(url, body_hash, simhash & 0xFFFFFFFFFFFFFFFF if simhash is not None else None)
+        finally:
+            conn.close()
+    
+    def band_keys(self, simhash):
+        """The four 16-bit bands of a SimHash"""
+        return [(simhash >> (16 * band)) & 0xFFFF for band in range(4)]
+    
+    def add(self, url, body_hash, simhash):
+        """Index a URL's fingerprint, replacing the one it had before"""
+        self.remove(url)
+        self.fingerprints[url] = (body_hash, simhash)
+        if body_hash:
+            self.exact.setdefault(body_hash, url)
+        if simhash is not None:
+            for band, key in zip(self.bands, self.band_keys(simhash)):
+                band.setdefault(key, {})[url] = simhash
+    
+    def remove(self, url):
+        """Drop a URL's fingerprint, e.g. once it is found to duplicate another article"""
+        previous = self.fingerprints.pop(url, None)
+        if previous is None:
+            return
+        old_hash, old_simhash = previous
+        if self.exact.get(old_hash) == url:
+            del self.exact[old_hash]
+        if old_simhash is not None:
+            for band, key in zip(self.bands, self.band_keys(old_simhash)):
+                band[key].pop(url, None)
+    
+    def find(self, url, body_hash, simhash):
+        """(canonical url, Hamming distance) of an indexed article other than url with the same body, or None"""
+        canonical = self.exact.get(body_hash) if body_hash else None
+        if canonical is not None and canonical != url:
+            return canonical, 0
+        if simhash is None:
+            return None
+        
+        best = None
+        for band, key in zip(self.bands, self.band_keys(simhash)):
+            for other_url, other in band.get(key, {}).items():
+                if other_url == url:
+                    continue
+                distance = bin(simhash ^ other).count('1')
+                if distance <= self.max_distance and (best is None or distance < best[1]):
+                    best = (other_url, distance)
+        return best
+
+class KeywordBatchAnalyzer:
+    """
+    Keywords for many article texts at once: each text is tokenized once, and
+    its term counts give both its keywords and the corpus document
+    frequencies. Keywords are the top_k most frequent non-stopword terms,
+    ties broken alphabetically.
+    """
+    
+    def __init__(self, top_k=20, stop_words=KEYWORD_STOP_WORDS):
+        self.top_k = top_k
+        self.stop_words = stop_words
+    
+    def term_counts(self, text):
+        """Counter of one text's non-stopword terms"""
+        return Counter(word for word in re.findall(KEYWORD_PATTERN, text.lower()) if word not in self.stop_words)
+    
+    def top_terms(self, counts):
+        """The top_k terms of a term_counts() Counter"""
+        return [word for word, _ in heapq.nsmallest(self.top_k, counts.items(), key=lambda item: (-item[1], item[0]))]
+    
+    def keywords(self, text):
+        """Top terms of one text"""
+        return self.top_terms(self.term_counts(text))
+    
+    def analyze(self, texts):
+        """
+        (top terms of each text, term counts of each text, Counter of how
+        many texts contain each term)
+        """
+        keywords = []
+        term_counts = []
+        document_frequency = Counter()
+        for text in texts:
+            counts = self.term_counts(text or '')
+            keywords.append(self.top_terms(counts))
+            term_counts.append(counts)
+            document_frequency.update(counts.keys())
+        return keywords, term_counts, document_frequency
+
+class PatternMatcher:
+    """
+    Finds many patterns with the hits re.findall would give for each pattern
+    on its own. Literal patterns are merged into a character trie scanned with
+    a lookahead, so every position reports its longest literal without
+    consuming text and the work does not grow with the number of literals;
+    shorter literals at the same position are that literal's prefixes. Hits
+    are then thinned to each pattern's own non-overlapping matches. Patterns
+    using regex syntax are scanned separately.
+    """
+    
+    def __init__(self, patterns):
+        self.literals = []
+        self.expressions = {}    # pattern -> compiled regex, scanned on its own
+        for pattern in dict.fromkeys(patterns):
+            if re.fullmatch(r'[\w \-]+', pattern):
+                self.literals.append(pattern)
+            else:
+                self.expressions[pattern] = re.compile(pattern)
+        
+        # Literals found wherever a given literal is the longest match
+        self.prefixes = {
+            literal: [other for other in self.literals if literal.startswith(other)]
+            for literal in self.literals
+        }
+        self.regex = re.compile(f"(?=({self.trie_pattern(self.literals)}))" if self.literals else r'(?!)')
+    
+    def trie_pattern(self, literals):
+        """Regex matching any of the literals, longest first, shaped like a character trie"""
+        trie = {}
+        for literal in literals:
+            node = trie
+            for char in literal:
+                node = node.setdefault(char, {})
+            node[''] = {}
+        
+        def branch(node):
+            ends_here = '' in node
+            branches = [re.escape(char) + branch(child) for char, child in sorted(node.items()) if char]
+            if not branches:
+                return ''
+            pattern = branches[0] if len(branches) == 1 and not ends_here else f"(?:{'|'.join(branches)})"
+            return f"(?:{pattern})?" if ends_here else pattern
+        
+        return branch(trie)
+    
+    def scan(self, text):
+        """
+        {pattern: [(offset, match), ...]} for every pattern found in text, where
+        match is the matched text, or its first group for patterns with groups
+        (what re.findall would give)
+        """
+        hits = {}
+        ends = {}
+        for match in self.regex.finditer(text):
+            start = match.start()
+            for literal in self.prefixes[match.group(1)]:
+                # Like re.findall, a pattern's next match starts after its previous one
+                if start >= ends.get(literal, 0):
+                    hits.setdefault(literal, []).append((start, literal))
+                    ends[literal] = start + len(literal)
+        for pattern, regex in self.expressions.items():
+            found = [(match.start(), match.group(1) if regex.groups else match.group())
+                     for match in regex.finditer(text)]
+            if found:
+                hits[pattern] = found
+        return hits
+
+# One matcher for every pattern analyze_content reports
+ANALYSIS_MATCHER = PatternMatcher(POWER_WORDS + CTA_PATTERNS + SOCIAL_PROOF_PATTERNS)
 
 class HealthContentScraper:
     """
     Advanced web scraper for health and wellness content analysis
     """
     
-    def __init__(self, db_path="content_intelligence.db"):
+    def __init__(self, db_path="content_intelligence.db", max_concurrency=20, per_host_limit=2, host_delay=1.0,
+                 parse_processes=None, parse_queue_size=None, write_batch_size=100, write_flush_interval=2.0,
+                 parser_backend='lxml', max_page_bytes=2 * 1024 * 1024, max_host_rate=10.0,
+                 connector_config=None, max_retries=3, retry_backoff=2.0, discovery='both',
+                 max_depth=3, site_page_budget=5000, content_codec=None,
+                 shard_index=0, shard_count=1, handoff_path=None, shared_db_path=None,
+                 record_path=None, replay_url=None, sentiment_backend='lexicon'):
         self.db_path = db_path
+        
+        # Offline benchmarking: record_path saves every response to a WARC-like archive;
+        # replay_url sends every request to a ReplayServer serving such an archive instead
+        self.record_path = record_path
+        self.replay_url = replay_url
+        self.archive = None
+        
+        # Sharded crawl: this scraper only fetches hosts where shard_for_host(host) == shard_index,
+        # handing other hosts' URLs to their shard through the handoff database. Each shard
+        # checkpoints into its own db_path; shared_db_path is the database shards merge into
+        if not 0 <= shard_index < shard_count:
+            raise ValueError(f"Shard index {shard_index} is outside 0..{shard_count - 1}")
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        self.handoff_path = handoff_path
+        self.shared_db_path = shared_db_path
+        self.handoff = None
+        self.handoff_interval = 30.0
+        
+        # Article bodies are stored compressed outside the articles table
+        self.content_store = ContentStore(content_codec)
+        self.keyword_index = KeywordIndex()
+        
+        # Crawl telemetry, dumped to metrics_path every metrics_interval seconds during a run
+        self.metrics = CrawlMetrics()
+        self.metrics_path = "scraper_metrics.json"
+        if shard_count > 1:
+            self.metrics_path = f"scraper_metrics.shard-{shard_index}-of-{shard_count}.json"
+        self.metrics_interval = 10.0
         self.setup_database()
         
+        # HTML parser used for every page; all backends produce identical extraction results
+        if parser_backend not in PARSER_BACKENDS:
+            raise ValueError(f"Unknown parser backend: {parser_backend}")
+        if parser_backend == 'lexbor' and LexborHTMLParser is None:
+            print("selectolax is not installed, falling back to the lxml parser backend")
+            parser_backend = 'lxml'
+        self.parser_backend = parser_backend
+        
+        # Scores article polarity for analyze_content; scores are cached per body hash and backend
+        if sentiment_backend not in SENTIMENT_BACKENDS:
+            raise ValueError(f"Unknown sentiment backend: {sentiment_backend}")
+        self.sentiment_backend = sentiment_backend
+        self.sentiment = SENTIMENT_BACKENDS[sentiment_backend]()
+        
+        # Downloads are streamed and abandoned past this size or when the
+        # server says the body is not HTML
+        self.max_page_bytes = max_page_bytes
+        self.html_content_types = ('text/html', 'application/xhtml+xml')
+        self.read_chunk_size = 64 * 1024
+        
+        # Article discovery: 'links' on each homepage, 'sitemap' files, or 'both'
+        if discovery not in ('links', 'sitemap', 'both'):
+            raise ValueError(f"Unknown discovery mode: {discovery}")
+        self.discovery = discovery
+        self.max_sitemap_bytes = 50 * 1024 * 1024   # protocol limit for an uncompressed sitemap
+        
+        # Crawl scheduling: total in-flight requests and requests per host
+        self.max_concurrency = max_concurrency
+        self.per_host_limit = per_host_limit
+        self.frontier = None
+        
+        # Articles whose text repeats one already stored (syndication, AMP, query
+        # variants) are recorded as duplicates instead of being analyzed again
+        self.duplicates = None
+        self.duplicate_distance = 3       # SimHash bits two near-duplicates may differ by
+        self.duplicate_rechecks = set()   # duplicates whose canonical changed, to download in full again
+        self.keyword_analyzer = KeywordBatchAnalyzer()
+        self.min_shingles = 20            # shorter texts only get exact-match detection
+        
+        # Breadth-first crawl: links are followed max_depth levels from each site
+        # root, at most site_page_budget pages per host per crawl. Shallower URLs
+        # go first; articles get a bonus so they run ahead of navigation pages
+        self.max_depth = max_depth
+        self.site_page_budget = site_page_budget
+        self.depth_penalty = 10
+        self.article_bonus = 5
+        
+        # Per-host request rate starts at one request per host_delay seconds and
+        # adapts between that and max_host_rate; kept across runs
+        self.host_delay = host_delay
+        self.rate_limiter = HostRateLimiter(
+            initial_rate=1.0 / host_delay if host_delay > 0 else max_host_rate,
+            max_rate=max_host_rate
+        )
+        
+        # robots.txt rules per host: host -> (RobotFileParser, expiry time, error). A robots.txt
+        # that could not be read (5xx, 429, connection error) is retried after robots_error_ttl,
+        # and its host's URLs wait for it instead of being crawled unrestricted
+        self.respect_robots = True
+        self.robots_ttl = 24 * 3600
+        self.robots_error_ttl = 300
+        self.max_robots_bytes = 512 * 1024
+        self.robots = {}
+        self.robots_pending = {}
+        
+        # Parse/analysis stage: worker processes (0 parses inline on the event loop)
+        # and how many fetched pages may wait for a parse worker before fetching pauses
+        self.parse_processes = parse_processes if parse_processes is not None else (os.cpu_count() or 1)
+        self.parse_queue_size = parse_queue_size or 2 * max(self.parse_processes, 1)
+        self.parse_executor = None
+        self.parse_slots = None
+        
+        # Database writes are batched on a single connection during a crawl
+        self.write_batch_size = write_batch_size
+        self.write_flush_interval = write_flush_interval
+        self.writer = None
+        
+        # Per-article reads run on one lookup thread with its own open connection during a crawl
+        self.lookup_executor = None
+        self.lookup_conn = None
+        
+        # HTTP connection pool shared by every request in a crawl (timeouts in seconds)
+        self.connector_config = {
+            'limit': 100,                # open connections across all hosts
+            'limit_per_host': max(per_host_limit, 1),
+            'keepalive_timeout': 30,     # idle seconds before a pooled connection closes
+            'dns_cache_ttl': 600,
+            'connect_timeout': 10,
+            'read_timeout': 30,          # longest silence while reading a response
+            'total_timeout': 120,        # whole request, including the body
+        }
+        if connector_config:
+            self.connector_config.update(connector_config)
+        self.pool_stats = {}
+        
+        # Transient fetch failures are retried with jittered exponential backoff
+        # (seconds, capped at max_retry_delay) before landing in the failure ledger
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_retry_delay = 300.0
+        
         # Major health and wellness sites to scrape
         self.target_sites = [
             # Health Authority Sites
@@ -62,6 +2015,12 @@ class HealthContentScraper:
             "https://www.nih.gov",
         ]
         
+        # Article URL patterns per host; hosts not listed use DEFAULT_ARTICLE_PATTERNS
+        self.site_article_patterns = {
+            "pubmed.ncbi.nlm.nih.gov": DEFAULT_ARTICLE_PATTERNS + [r'^https://pubmed\.ncbi\.nlm\.nih\.gov/\d+$'],
+        }
+        self.article_matchers = {}
+        
         # Headers to avoid being blocked
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
@@ -72,6 +2031,14 @@ class HealthContentScraper:
             'Upgrade-Insecure-Requests': '1'
         }
     
+    def __getstate__(self):
+        """Leave event-loop and pool handles behind when copied into a parse worker"""
+        state = self.__dict__.copy()
+        for key in ('frontier', 'parse_executor', 'parse_slots', 'writer', 'robots_pending', 'duplicates', 'metrics',
+                    'handoff', 'archive', 'lookup_executor', 'lookup_conn'):
+            state[key] = None
+        return state
+    
     def setup_database(self):
         """Initialize SQLite database for storing scraped content"""
         conn = sqlite3.connect(self.db_path)
@@ -94,7 +2061,78 @@ class HealthContentScraper:
                 social_shares INTEGER,
                 estimated_traffic INTEGER,
                 scraped_date TIMESTAMP,
-                source_domain TEXT
+                source_domain TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT
+            )
+        ''')
+        
+        # Databases created before conditional re-fetch lack the validator columns
+        existing_columns = {row[1] for row in cursor.execute('PRAGMA table_info(articles)')}
+        for column in ('etag', 'last_modified', 'content_hash'):
+            if column not in existing_columns:
+                cursor.execute(f'ALTER TABLE articles ADD COLUMN {column} TEXT')
+        
+        # Body fingerprints for duplicate detection, one row per stored article
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS content_fingerprints (
+                url TEXT PRIMARY KEY,
+                body_hash TEXT,
+                simhash INTEGER
+            )
+        ''')
+        
+        # URLs whose body duplicates a stored article, with the validators to revalidate them
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS article_duplicates (
+                url TEXT PRIMARY KEY,
+                canonical_url TEXT,
+                distance INTEGER,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT,
+                scraped_date TIMESTAMP
+            )
+        ''')
+        
+        # Links found on each crawled article page, so an unchanged page can still queue them
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS article_links (
+                url TEXT PRIMARY KEY,
+                article_links TEXT,
+                page_links TEXT,
+                scraped_date TIMESTAMP
+            )
+        ''')
+        
+        # Earlier versions of re-scraped articles, newest body kept in the content store;
+        # each delta rebuilds this version's body from the next newer one (see body_delta)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS article_revisions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                article_id INTEGER,
+                title TEXT,
+                word_count INTEGER,
+                content_hash TEXT,
+                body_hash TEXT,
+                scraped_date TIMESTAMP,
+                replaced_date TIMESTAMP,
+                codec TEXT,
+                dictionary_id INTEGER,
+                delta BLOB,
+                FOREIGN KEY (article_id) REFERENCES articles (id)
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_article_revisions_article ON article_revisions (article_id)')
+        
+        # Sentiment scores by body hash, so identical bodies are scored once per backend
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sentiment_scores (
+                body_hash TEXT,
+                backend TEXT,
+                polarity REAL,
+                PRIMARY KEY (body_hash, backend)
             )
         ''')
         
@@ -111,129 +2149,856 @@ class HealthContentScraper:
                 FOREIGN KEY (article_id) REFERENCES articles (id)
             )
         ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_headlines_article ON headlines (article_id)')
+        
+        # Re-scrapes used to replace article rows under new ids, orphaning their headlines;
+        # databases from before stable ids (user_version 0) are cleaned up once
+        if cursor.execute('PRAGMA user_version').fetchone()[0] < 1:
+            cursor.execute('DELETE FROM headlines WHERE article_id NOT IN (SELECT id FROM articles)')
+            cursor.execute('PRAGMA user_version = 1')
+        
+        # Keywords table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS keywords (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                keyword TEXT,
+                frequency INTEGER,
+                search_volume INTEGER,
+                competition REAL,
+                article_id INTEGER,
+                tf REAL,
+                added_date TIMESTAMP,
+                FOREIGN KEY (article_id) REFERENCES articles (id)
+            )
+        ''')
+        self.keyword_index.setup_tables(cursor)
+        
+        # Content patterns table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS content_patterns (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                pattern_type TEXT,
+                pattern_data TEXT,
+                effectiveness_score REAL,
+                usage_count INTEGER,
+                last_updated TIMESTAMP
+            )
+        ''')
+        
+        # Conversion elements table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS conversion_elements (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                element_type TEXT,
+                element_text TEXT,
+                placement TEXT,
+                conversion_score REAL,
+                article_id INTEGER,
+                FOREIGN KEY (article_id) REFERENCES articles (id)
+            )
+        ''')
+        
+        # Compressed article bodies and their dictionaries
+        self.content_store.setup_tables(cursor)
+        
+        conn.commit()
+        self.content_store.load(conn)
+        conn.close()
+    
+    def get_article_content(self, url):
+        """Body text of a stored article, decompressed; None if the URL is not stored"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            row = conn.execute('SELECT id, content FROM articles WHERE url = ?', (url,)).fetchone()
+            if row is None:
+                return None
+            
+            # Rows stored before compression keep their plaintext until compress_stored_content runs
+            content = self.content_store.read(conn, row[0])
+            return content if content is not None else row[1]
+        finally:
+            conn.close()
+    
+    def train_content_dictionary(self, sample_count=1000):
+        """Train a compression dictionary on a random sample of stored bodies; new bodies use it"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            ids = [row[0] for row in conn.execute(
+                'SELECT article_id FROM article_bodies ORDER BY RANDOM() LIMIT ?', (sample_count,)
+            )]
+            samples = [self.content_store.read(conn, article_id) for article_id in ids]
+            if len(samples) < 10:
+                print("Not enough stored articles to train a compression dictionary")
+                return None
+            
+            dictionary_id = self.content_store.train(conn, samples)
+            print(f"Trained {self.content_store.codec} dictionary {dictionary_id} on {len(samples)} articles")
+            return dictionary_id
+        finally:
+            conn.close()
+    
+    def compress_stored_content(self, batch_size=1000):
+        """Move plaintext bodies from articles.content into the compressed store; returns rows moved.
+        Run VACUUM afterwards to give the freed pages back to the filesystem."""
+        conn = sqlite3.connect(self.db_path)
+        moved = 0
+        try:
+            while True:
+                rows = conn.execute(
+                    'SELECT id, content FROM articles WHERE content IS NOT NULL LIMIT ?', (batch_size,)
+                ).fetchall()
+                if not rows:
+                    break
+                
+                cursor = conn.cursor()
+                for article_id, content in rows:
+                    self.content_store.write(cursor, article_id, content)
+                    cursor.execute('UPDATE articles SET content = NULL WHERE id = ?', (article_id,))
+                conn.commit()
+                moved += len(rows)
+        finally:
+            conn.close()
+        
+        return moved
+    
+    def rebuild_keywords(self, batch_size=1000):
+        """
+        Re-extract the keywords of every stored article, batch_size articles at a
+        time through the keyword analyzer, and rebuild the keyword index from them
+        in one transaction. Rebuilt postings are dated by their article's scrape.
+        Returns a Counter of how many articles each term appears in.
+        """
+        conn = sqlite3.connect(self.db_path)
+        document_frequency = Counter()
+        last_id = 0
+        try:
+            # Nothing is committed until the end, so an interrupted rebuild leaves the old index
+            conn.execute('DELETE FROM keywords')
+            while True:
+                rows = conn.execute(
+                    'SELECT id, content, scraped_date FROM articles WHERE id > ? ORDER BY id LIMIT ?',
+                    (last_id, batch_size)
+                ).fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                
+                texts = [self.content_store.read(conn, article_id) or content or '' for article_id, content, _ in rows]
+                keywords, term_counts, batch_frequency = self.keyword_analyzer.analyze(texts)
+                document_frequency.update(batch_frequency)
+                conn.executemany(
+                    'UPDATE articles SET keywords = ? WHERE id = ?',
+                    [(json.dumps(article_keywords), article_id)
+                     for article_keywords, (article_id, _, _) in zip(keywords, rows)]
+                )
+                for counts, (article_id, _, scraped_date) in zip(term_counts, rows):
+                    self.keyword_index.insert_postings(conn, article_id, counts, sum(counts.values()), scraped_date)
+            self.keyword_index.rebuild_stats(conn)
+            conn.commit()
+        finally:
+            conn.close()
+        
+        return document_frequency
+    
+    async def scrape_site(self, session, url, max_pages=100, depth=0):
+        """Discover links on a site root (depth 0) or navigation page and queue them on the crawl frontier.
+        Returns the discovered article links, or None if the page could not be processed;
+        fetch failures raise FetchError."""
+        try:
+            # Sitemaps list far more articles than a homepage links to
+            if depth == 0 and self.discovery != 'links' and self.frontier is not None:
+                for sitemap_url in self.sitemap_urls(url):
+                    await self.frontier.put(sitemap_url, 'sitemap', self.crawl_priority('sitemap', 0))
+                if self.discovery == 'sitemap':
+                    return []
+            
+            status, _, html = await self.fetch_page(session, url)
+            if html is None:
+                return None
+            
+            # Extract article links, plus same-site pages for the next BFS level
+            article_links, page_links = await self.run_parse_task('extract_links_from_html', html, url)
+            article_links = article_links[:max_pages]
+            
+            # Hand individual articles to the worker pool
+            await self.queue_links(article_links, page_links[:max_pages], depth + 1)
+            
+            return article_links
+        
+        except FetchError:
+            raise
+        except Exception as e:
+            print(f"Error scraping {url}: {str(e)}")
+            return None
+    
+    async def fetch_page(self, session, url, headers=None, read_body=None):
+        """
+        GET a page and report how the host responded to the rate limiter.
+        Returns (status, response headers, body) where body comes from read_body
+        (read_html by default) and is None only for a 304; anything else that
+        yields no body raises FetchError.
+        """
+        host = urlsplit(url).netloc
+        started = time.monotonic()
+        try:
+            async with self.request(session, url, headers or self.headers) as response:
+                status = response.status
+                self.rate_limiter.record_response(
+                    host, status, time.monotonic() - started,
+                    response.headers.get('Retry-After')
+                )
+                
+                if status == 304:
+                    self.metrics.record_fetch(host, status, time.monotonic() - started)
+                    return status, response.headers, None
+                if status != 200:
+                    raise FetchError(f"HTTP {status}", status in RETRY_STATUSES or status >= 500, status)
+                
+                body = await (read_body or self.read_html)(response)
+                if body is None:
+                    raise FetchError("Unsupported or oversized response body", status=status,
+                                     error_class='unusable_body')
+                self.metrics.record_fetch(host, status, time.monotonic() - started)
+                return status, response.headers, body
+                
+        except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+            # Timeouts, refused or reset connections and truncated bodies are usually transient
+            self.rate_limiter.record_response(host, None, time.monotonic() - started)
+            raise FetchError(f"{type(e).__name__}: {e}", retryable=True, error_class=type(e).__name__) from e
+        except aiohttp.ClientError as e:
+            self.rate_limiter.record_response(host, None, time.monotonic() - started)
+            raise FetchError(f"{type(e).__name__}: {e}", error_class=type(e).__name__) from e
+    
+    @contextlib.asynccontextmanager
+    async def request(self, session, url, headers):
+        """
+        GET a URL, or ask the replay server for it when replaying an archive;
+        the response is saved to the archive when recording one
+        """
+        if self.replay_url:
+            headers = dict(headers, **{REPLAY_URL_HEADER: url})
+        async with session.get(self.replay_url or url, headers=headers) as response:
+            if self.archive is None:
+                yield response
+                return
+            
+            recording = RecordingResponse(response)
+            try:
+                yield recording
+            finally:
+                self.archive.record(url, recording)
+    
+    async def allowed_by_robots(self, session, url):
+        """
+        Check a URL against its host's robots.txt, fetching the rules once per
+        robots_ttl. Raises a retryable FetchError while the robots.txt is unavailable.
+        """
+        if not self.respect_robots:
+            return True
+        
+        parts = urlsplit(url)
+        host = parts.netloc
+        cached = self.robots.get(host)
+        if cached is None or time.time() > cached[1]:
+            # Concurrent workers for the same host share one robots.txt download
+            task = self.robots_pending.get(host)
+            if task is None:
+                task = asyncio.ensure_future(self.fetch_robots(session, f"{parts.scheme}://{host}"))
+                self.robots_pending[host] = task
+            try:
+                cached = await asyncio.shield(task)
+            finally:
+                self.robots_pending.pop(host, None)
+        
+        parser, expires, error = cached
+        if error is not None:
+            raise FetchError(f"robots.txt unavailable: {error}", retryable=True, error_class='robots_unavailable',
+                             retry_after=max(expires - time.time(), 0))
+        return parser.can_fetch(self.headers['User-Agent'], url)
+    
+    async def fetch_robots(self, session, origin):
+        """
+        Download and parse a host's robots.txt, applying its crawl delay to the rate limiter.
+        As in RFC 9309, a missing robots.txt (4xx) allows everything, while a server error,
+        429 or unreachable host disallows everything until it is fetched again.
+        """
+        parser = RobotFileParser(f"{origin}/robots.txt")
+        error = None
+        try:
+            async with self.request(session, parser.url, self.headers) as response:
+                if response.status in (401, 403):
+                    parser.disallow_all = True
+                elif response.status == 200:
+                    # Rules past max_robots_bytes are ignored
+                    body = bytearray()
+                    async for chunk in response.content.iter_chunked(self.read_chunk_size):
+                        body += chunk
+                        if len(body) >= self.max_robots_bytes:
+                            break
+                    text = bytes(body[:self.max_robots_bytes]).decode('utf-8', errors='replace')
+                    parser.parse(text.splitlines())
+                elif response.status == 429 or response.status >= 500:
+                    error = f"HTTP {response.status}"
+                else:
+                    parser.allow_all = True
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
         
-        # Keywords table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS keywords (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                keyword TEXT,
-                frequency INTEGER,
-                search_volume INTEGER,
-                competition REAL,
-                article_id INTEGER,
-                FOREIGN KEY (article_id) REFERENCES articles (id)
-            )
-        ''')
+        ttl = self.robots_ttl
+        if error is not None:
+            print(f"Could not read {parser.url}: {error}")
+            parser.disallow_all = True
+            ttl = self.robots_error_ttl
         
-        # Content patterns table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS content_patterns (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                pattern_type TEXT,
-                pattern_data TEXT,
-                effectiveness_score REAL,
-                usage_count INTEGER,
-                last_updated TIMESTAMP
-            )
-        ''')
+        user_agent = self.headers['User-Agent']
+        delay = parser.crawl_delay(user_agent)
+        request_rate = parser.request_rate(user_agent)
+        if request_rate and request_rate.requests:
+            delay = max(delay or 0, request_rate.seconds / request_rate.requests)
+        self.rate_limiter.set_robots_delay(urlsplit(origin).netloc, float(delay) if delay else None)
         
-        # Conversion elements table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS conversion_elements (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                element_type TEXT,
-                element_text TEXT,
-                placement TEXT,
-                conversion_score REAL,
-                article_id INTEGER,
-                FOREIGN KEY (article_id) REFERENCES articles (id)
-            )
-        ''')
+        result = (parser, time.time() + ttl, error)
+        self.robots[urlsplit(origin).netloc] = result
+        return result
+    
+    async def read_html(self, response):
+        """
+        Stream an HTML response body, decoding it chunk by chunk. Returns None,
+        without downloading the rest, for non-HTML or oversized responses.
+        """
+        url = response.url
+        if 'Content-Type' in response.headers and response.content_type not in self.html_content_types:
+            print(f"Skipping {url}: content type {response.content_type}")
+            return None
         
-        conn.commit()
-        conn.close()
+        if response.content_length is not None and response.content_length > self.max_page_bytes:
+            print(f"Skipping {url}: {response.content_length} bytes exceeds limit")
+            return None
+        
+        decoder = None
+        parts = []
+        received = 0
+        async for chunk in response.content.iter_chunked(self.read_chunk_size):
+            received += len(chunk)
+            self.metrics.record_bytes(len(chunk))
+            if received > self.max_page_bytes:
+                print(f"Skipping {url}: body exceeds {self.max_page_bytes} bytes")
+                return None
+            
+            if decoder is None:
+                encoding = self.detect_encoding(response.charset, chunk)
+                decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+            parts.append(decoder.decode(chunk))
+        
+        if decoder is not None:
+            parts.append(decoder.decode(b'', final=True))
+        return ''.join(parts)
     
-    async def scrape_site(self, session, url, max_pages=100):
-        """Scrape a single website for content"""
+    async def read_sitemap(self, response):
+        """
+        Stream a sitemap, plain or gzipped, through an incremental XML parser.
+        Returns (root, [(loc, lastmod), ...]) with root 'urlset' or 'sitemapindex',
+        or None for malformed or oversized sitemaps.
+        """
+        url = response.url
+        parser = XMLPullParser(events=('end',))
+        inflater = None
+        gzipped = None
+        root = None
+        entries = []
+        entry = {}
+        received = 0
         try:
-            async with session.get(url, headers=self.headers, timeout=30) as response:
-                if response.status == 200:
-                    html = await response.text()
-                    soup = BeautifulSoup(html, 'html.parser')
+            async for chunk in response.content.iter_chunked(self.read_chunk_size):
+                self.metrics.record_bytes(len(chunk))
+                if gzipped is None:
+                    # .xml.gz files arrive still compressed (aiohttp only undoes Content-Encoding)
+                    gzipped = chunk[:2] == b'\x1f\x8b'
+                    if gzipped:
+                        inflater = zlib.decompressobj(zlib.MAX_WBITS | 16)
+                
+                while chunk:
+                    if gzipped:
+                        # Bounded output per call so a compression bomb stops at the size cap
+                        data = inflater.decompress(chunk, self.read_chunk_size)
+                        chunk = inflater.unconsumed_tail
+                    else:
+                        data, chunk = chunk, b''
                     
-                    # Extract article links
-                    article_links = self.extract_article_links(soup, url)
+                    received += len(data)
+                    if received > self.max_sitemap_bytes:
+                        print(f"Skipping {url}: sitemap exceeds {self.max_sitemap_bytes} bytes")
+                        return None
                     
-                    # Scrape individual articles
-                    for article_url in article_links[:max_pages]:
-                        await self.scrape_article(session, article_url)
-                        await asyncio.sleep(1)  # Rate limiting
-                        
-        except Exception as e:
-            print(f"Error scraping {url}: {str(e)}")
+                    parser.feed(data)
+                    for _, element in parser.read_events():
+                        # Only sitemap elements count - image:loc and friends live in other namespaces
+                        tag = element.tag
+                        if tag.startswith(SITEMAP_NS):
+                            tag = tag[len(SITEMAP_NS):]
+                        if tag in ('loc', 'lastmod'):
+                            entry[tag] = (element.text or '').strip()
+                        elif tag in ('url', 'sitemap'):
+                            if entry.get('loc'):
+                                entries.append((entry['loc'], entry.get('lastmod')))
+                            entry = {}
+                            element.clear()
+                        elif tag in ('urlset', 'sitemapindex'):
+                            root = tag
+            parser.close()
+        except (ParseError, zlib.error) as e:
+            print(f"Skipping {url}: malformed sitemap ({str(e)})")
+            return None
+        
+        return root, entries
+    
+    def detect_encoding(self, header_charset, first_chunk):
+        """Pick a decoder from the Content-Type charset, a <meta charset> in the first chunk, or UTF-8"""
+        candidates = [header_charset]
+        match = re.search(rb'<meta[^>]+charset=["\']?([\w-]+)', first_chunk[:4096], re.IGNORECASE)
+        if match:
+            candidates.append(match.group(1).decode('ascii'))
+        
+        for encoding in candidates:
+            if not encoding:
+                continue
+            try:
+                return codecs.lookup(encoding).name
+            except LookupError:
+                continue
+        return 'utf-8'
+    
+    def parse_html(self, html):
+        """Parse a page with the configured parser backend"""
+        return PARSER_BACKENDS[self.parser_backend](html)
     
-    def extract_article_links(self, soup, base_url):
-        """Extract article links from a page"""
+    def extract_links_from_html(self, html, base_url):
+        """Parse a listing page and extract its (article links, page links)"""
+        return self.extract_crawl_links(self.parse_html(html), base_url)
+    
+    def extract_article_links(self, doc, base_url):
+        """Extract normalized, de-duplicated article links from a page, in page order"""
+        return self.extract_crawl_links(doc, base_url)[0]
+    
+    def extract_crawl_links(self, doc, base_url):
+        """
+        Normalized, de-duplicated links from a page, in page order, as
+        (article links on any host, other links on the page's own host)
+        """
         links = []
-        for link in soup.find_all('a', href=True):
-            href = link['href']
-            full_url = urljoin(base_url, href)
+        pages = []
+        seen_hrefs = set()
+        seen_urls = set()
+        base = urlsplit(base_url)
+        origin = f"{base.scheme}://{base.netloc}"
+        for link in doc.find_all('a'):
+            href = doc.attr(link, 'href')
+            if href is None or href in seen_hrefs:
+                continue
+            seen_hrefs.add(href)
             
-            # Filter for article URLs
-            if self.is_article_url(full_url):
+            full_url = self.normalize_url(self.resolve_href(base_url, origin, href))
+            if full_url is None or full_url in seen_urls:
+                continue
+            seen_urls.add(full_url)
+            
+            # Filter for article URLs; normalized URLs always look like scheme://host/...
+            host = full_url.split('/', 3)[2]
+            if self.article_matcher(host).search(full_url):
                 links.append(full_url)
+            elif host == base.netloc and not full_url.partition('?')[0].lower().endswith(NON_HTML_EXTENSIONS):
+                pages.append(full_url)
+        
+        return links, pages
+    
+    def resolve_href(self, base_url, origin, href):
+        """urljoin, with string-only fast paths for the absolute and root-relative links most pages use"""
+        href = href.strip()
+        if '/.' not in href and '\t' not in href and '\n' not in href and '\r' not in href:
+            if href[:8].lower().startswith(('http://', 'https://')):
+                return href
+            if href.startswith('//'):
+                return origin.split(':', 1)[0] + ':' + href
+            if href.startswith('/'):
+                return origin + href
+        return urljoin(base_url, href)
+    
+    def normalize_url(self, url):
+        """
+        Canonical form of an http(s) URL: lowercase scheme and host, no fragment,
+        no tracking parameters and no trailing slash. Returns None for other schemes.
+        """
+        scheme, separator, rest = url.partition('://')
+        scheme = scheme.lower()
+        if not separator or scheme not in ('http', 'https'):
+            return None
+        
+        rest = rest.partition('#')[0]
+        rest, _, query = rest.partition('?')
+        host, slash, path = rest.partition('/')
+        
+        if query:
+            params = parse_qsl(query, keep_blank_values=True)
+            kept = [
+                (key, value) for key, value in params
+                if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PARAM_PREFIXES)
+            ]
+            # Only re-encode when something was dropped, so untouched queries keep their form
+            if len(kept) != len(params):
+                query = urlencode(kept)
         
-        return list(set(links))  # Remove duplicates
+        normalized = f"{scheme}://{host.lower()}{('/' + path).rstrip('/') if slash else ''}"
+        return f"{normalized}?{query}" if query else normalized
+    
+    def article_matcher(self, host):
+        """Compiled matcher combining every article pattern for a host"""
+        matcher = self.article_matchers.get(host)
+        if matcher is None:
+            patterns = self.site_article_patterns.get(host, DEFAULT_ARTICLE_PATTERNS)
+            matcher = re.compile('|'.join(f'(?:{pattern})' for pattern in patterns))
+            self.article_matchers[host] = matcher
+        return matcher
     
     def is_article_url(self, url):
         """Determine if URL is likely an article"""
-        article_patterns = [
-            r'/article/',
-            r'/blog/',
-            r'/post/',
-            r'/\d{4}/\d{2}/',  # Date-based URLs
-            r'/health/',
-            r'/fitness/',
-            r'/nutrition/',
-            r'/wellness/',
-        ]
-        
-        return any(re.search(pattern, url) for pattern in article_patterns)
+        return self.article_matcher(urlsplit(url).netloc).search(url) is not None
     
-    async def scrape_article(self, session, url):
-        """Scrape individual article and analyze content"""
+    async def scrape_article(self, session, url, depth=1):
+        """Scrape individual article and analyze content. Returns True on success;
+        fetch failures raise FetchError."""
         try:
-            async with session.get(url, headers=self.headers, timeout=30) as response:
-                if response.status == 200:
-                    html = await response.text()
-                    soup = BeautifulSoup(html, 'html.parser')
-                    
-                    # Extract article data
-                    article_data = self.extract_article_data(soup, url)
-                    
-                    # Analyze content
-                    analysis = self.analyze_content(article_data)
-                    
-                    # Store in database
-                    self.store_article(article_data, analysis)
-                    
+            # Links are collected while the crawl has levels left below this page;
+            # an unchanged page queues the links stored from its last download
+            stored = await self.run_read(self.read_stored_article, url)
+            follow_links = self.frontier is not None and depth < self.max_depth
+            stored_links = stored['links'] if follow_links else None
+            
+            # Revalidate pages we already have instead of downloading them again,
+            # unless we need their links and have none stored
+            etag, last_modified, content_hash = stored['validators']
+            if url in self.duplicate_rechecks:
+                # The article this URL duplicated has changed - compare its body again
+                self.duplicate_rechecks.discard(url)
+                etag = last_modified = content_hash = None
+            headers = dict(self.headers)
+            if not follow_links or stored_links is not None:
+                if etag:
+                    headers['If-None-Match'] = etag
+                if last_modified:
+                    headers['If-Modified-Since'] = last_modified
+            
+            status, response_headers, html = await self.fetch_page(session, url, headers)
+            if status == 304:
+                self.mark_article_unchanged(url, etag, last_modified)
+                if follow_links:
+                    await self.queue_links(*stored_links, depth + 1)
+                return True
+            
+            etag = response_headers.get('ETag', etag)
+            last_modified = response_headers.get('Last-Modified', last_modified)
+            
+            # Server ignored the validators but the page is byte-for-byte the same
+            new_hash = hashlib.sha256(html.encode('utf-8')).hexdigest()
+            if new_hash == content_hash:
+                self.mark_article_unchanged(url, etag, last_modified)
+                if follow_links:
+                    if stored_links is None:
+                        stored_links = await self.run_parse_task('extract_links_from_html', html, url)
+                        self.run_write(self.write_page_links, url, *stored_links)
+                    await self.queue_links(*stored_links, depth + 1)
+                return True
+            stored_version = stored['version'] if content_hash else None
+            
+            # Extract article data in the parse stage, with links when following them
+            article_data, links = await self.run_parse_task('extract_article_html', html, url, follow_links)
+            if follow_links:
+                self.run_write(self.write_page_links, url, *links)
+            await self.queue_links(*links, depth + 1)
+            article_data['etag'] = etag
+            article_data['last_modified'] = last_modified
+            article_data['content_hash'] = new_hash
+            
+            # Only the markup around the article changed - keep the stored analysis
+            if stored_version == (article_data['body_hash'], article_data['title']):
+                self.mark_article_unchanged(url, etag, last_modified, new_hash)
+                return True
+            
+            # Same body as an article we already have - link it instead of analyzing it again.
+            # Duplicates recorded against this URL's old body may no longer match it
+            if self.duplicates is not None:
+                body_changed = stored['version'] is not None and stored['version'][0] != article_data['body_hash']
+                match = self.duplicates.find(url, article_data['body_hash'], article_data['simhash'])
+                if match is not None:
+                    self.duplicates.remove(url)
+                    if stored['version'] is not None:
+                        await self.recheck_duplicates_of(url, depth)
+                    self.store_duplicate(article_data, *match)
+                    return True
+                self.duplicates.add(url, article_data['body_hash'], article_data['simhash'])
+                if body_changed:
+                    await self.recheck_duplicates_of(url, depth)
+            
+            # Reuse the sentiment score of an identical body: usually this URL's stored one
+            if stored['version'] is not None and stored['version'][0] == article_data['body_hash']:
+                article_data['cached_polarity'] = stored['polarity']
+            else:
+                article_data['cached_polarity'] = await self.run_read(self.read_cached_sentiment,
+                                                                      article_data['body_hash'])
+            analysis = await self.run_parse_task('analyze_content', article_data)
+            
+            # Store in database
+            self.store_article(article_data, analysis)
+            return True
+        
+        except FetchError:
+            raise
         except Exception as e:
             print(f"Error scraping article {url}: {str(e)}")
+            return False
+    
+    async def scrape_sitemap(self, session, url):
+        """
+        Queue the articles, or child sitemaps, listed in a sitemap. Articles we
+        already stored are skipped unless their lastmod is newer than our copy.
+        Returns the number of URLs queued, or None if the sitemap could not be
+        processed; fetch failures raise FetchError.
+        """
+        try:
+            _, _, (root, entries) = await self.fetch_page(session, url, read_body=self.read_sitemap)
+            
+            queued = 0
+            if root == 'sitemapindex':
+                for loc, _ in entries:
+                    loc = self.normalize_url(loc)
+                    if loc and await self.frontier.put(loc, 'sitemap', self.crawl_priority('sitemap', 0)):
+                        queued += 1
+                return queued
+            
+            candidates = {}
+            for loc, lastmod in entries:
+                loc = self.normalize_url(loc)
+                if loc and self.is_article_url(loc):
+                    candidates[loc] = lastmod
+            
+            scraped = await self.run_read(self.read_scraped_dates, list(candidates))
+            for loc, lastmod in candidates.items():
+                if loc in scraped:
+                    modified = self.parse_lastmod(lastmod)
+                    if modified is None or modified <= scraped[loc]:
+                        continue
+                if await self.frontier.put(loc, 'article', self.crawl_priority('article', 1), depth=1):
+                    queued += 1
+            return queued
+        
+        except FetchError:
+            raise
+        except Exception as e:
+            print(f"Error reading sitemap {url}: {str(e)}")
+            return None
+    
+    def sitemap_urls(self, site_url):
+        """Sitemaps declared in a site's robots.txt, or the conventional /sitemap.xml"""
+        parts = urlsplit(site_url)
+        cached = self.robots.get(parts.netloc)
+        declared = cached[0].site_maps() if cached else None
+        if declared:
+            return [url for url in map(self.normalize_url, declared) if url]
+        return [f"{parts.scheme}://{parts.netloc}/sitemap.xml"]
+    
+    def parse_lastmod(self, value):
+        """A sitemap <lastmod> (W3C datetime) as a naive local datetime, or None"""
+        if not value:
+            return None
+        try:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone().replace(tzinfo=None)
+        return parsed
+    
+    def read_scraped_dates(self, conn, urls):
+        """Map each already-stored URL among urls to the datetime it was last scraped"""
+        scraped = {}
+        # Stay under SQLite's bound-parameter limit
+        for start in range(0, len(urls), 500):
+            batch = urls[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(
+                f'''
+                SELECT url, scraped_date FROM articles WHERE url IN ({placeholders})
+                UNION ALL
+                SELECT url, scraped_date FROM article_duplicates WHERE url IN ({placeholders})
+                ''',
+                batch + batch
+            )
+            for url, scraped_date in rows:
+                if scraped_date:
+                    scraped[url] = datetime.fromisoformat(scraped_date)
+        
+        return scraped
+    
+    def extract_article_html(self, html, url, follow_links=False):
+        """
+        Parse an article page; returns (article_data, links) where links is
+        extract_crawl_links' (article links, page links), or two empty lists
+        unless follow_links is set.
+        """
+        doc = self.parse_html(html)
+        article_data = self.extract_article_data(doc, url)
+        links = self.extract_crawl_links(doc, url) if follow_links else ([], [])
+        return article_data, links
+    
+    async def queue_links(self, article_links, page_links, depth):
+        """Queue links found on a page for the BFS level at depth, unless that is past max_depth"""
+        if self.frontier is None or depth > self.max_depth:
+            return
+        
+        article_priority = self.crawl_priority('article', depth)
+        for link in article_links:
+            await self.frontier.put(link, 'article', article_priority, depth=depth)
+        
+        # A navigation page on the last level would only lead past max_depth
+        if depth >= self.max_depth:
+            return
+        page_priority = self.crawl_priority('page', depth)
+        for link in page_links:
+            await self.frontier.put(link, 'page', page_priority, depth=depth)
+    
+    def crawl_priority(self, kind, depth):
+        """Frontier priority: site roots and sitemaps first, then by depth with articles ahead of pages"""
+        if kind in ('site', 'sitemap'):
+            return 100
+        return (self.article_bonus if kind == 'article' else 0) - depth * self.depth_penalty
+    
+    async def run_parse_task(self, method_name, *args):
+        """Run a CPU-heavy scraper method in the parse pool, waiting for a free slot first"""
+        started = time.monotonic()
+        if self.parse_executor is None:
+            try:
+                return getattr(self, method_name)(*args)
+            finally:
+                self.metrics.observe(method_name, time.monotonic() - started)
+        
+        # Fetch workers block here while the parse stage is saturated
+        self.metrics.parse_waiting += 1
+        try:
+            await self.parse_slots.acquire()
+        finally:
+            self.metrics.parse_waiting -= 1
+        self.metrics.observe('parse_slot_wait', time.monotonic() - started)
+        
+        self.metrics.parse_running += 1
+        started = time.monotonic()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.parse_executor, parse_worker_call, method_name, *args)
+        finally:
+            self.metrics.observe(method_name, time.monotonic() - started)
+            self.metrics.parse_running -= 1
+            self.parse_slots.release()
+    
+    async def run_read(self, read_func, *args):
+        """
+        Run read_func(conn, *args) off the event loop: on the lookup thread's
+        open connection during a crawl, otherwise on a fresh connection
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.lookup_executor, self.call_read, read_func, args)
+    
+    def call_read(self, read_func, args):
+        if self.lookup_executor is None:
+            conn = sqlite3.connect(self.db_path, timeout=60)
+            try:
+                return read_func(conn, *args)
+            finally:
+                conn.close()
+        
+        if self.lookup_conn is None:
+            self.lookup_conn = sqlite3.connect(self.db_path, timeout=60)
+        return read_func(self.lookup_conn, *args)
+    
+    def close_lookup_connection(self):
+        """Close the lookup thread's connection (run on the lookup thread)"""
+        if self.lookup_conn is not None:
+            self.lookup_conn.close()
+            self.lookup_conn = None
+    
+    def read_stored_article(self, conn, url):
+        """
+        What scrape_article needs to know about a URL before fetching it, in one
+        query, as a dict: 'validators', the (etag, last_modified, content_hash)
+        of its article or duplicate row; 'version', the article's (body_hash,
+        title); 'links', the (article links, page links) stored from its last
+        download; and 'polarity', the cached sentiment of its stored body.
+        Each is None, or all None for validators, when there is nothing stored.
+        """
+        row = conn.execute('''
+            SELECT a.id, a.etag, a.last_modified, a.content_hash, d.etag, d.last_modified, d.content_hash,
+                   f.body_hash, a.title, l.article_links, l.page_links, s.polarity
+            FROM (SELECT ? AS url) u
+            LEFT JOIN articles a ON a.url = u.url
+            LEFT JOIN article_duplicates d ON d.url = u.url
+            LEFT JOIN content_fingerprints f ON f.url = a.url
+            LEFT JOIN article_links l ON l.url = u.url
+            LEFT JOIN sentiment_scores s ON s.body_hash = f.body_hash AND s.backend = ?
+        ''', (url, self.sentiment_backend)).fetchone()
+        
+        return {
+            'validators': row[1:4] if row[0] is not None else row[4:7],
+            'version': (row[7], row[8]) if row[7] is not None else None,
+            'links': (json.loads(row[9]), json.loads(row[10])) if row[9] is not None else None,
+            'polarity': row[11],
+        }
+    
+    def read_cached_sentiment(self, conn, body_hash):
+        """Polarity the current sentiment backend gave an identical body, or None"""
+        row = conn.execute(
+            'SELECT polarity FROM sentiment_scores WHERE body_hash = ? AND backend = ?',
+            (body_hash, self.sentiment_backend)
+        ).fetchone()
+        return row[0] if row else None
+    
+    def write_page_links(self, cursor, url, article_links, page_links):
+        """SQL to store the links found on a page"""
+        cursor.execute('''
+            INSERT OR REPLACE INTO article_links (url, article_links, page_links, scraped_date)
+            VALUES (?, ?, ?, ?)
+        ''', (url, json.dumps(article_links), json.dumps(page_links), datetime.now()))
     
-    def extract_article_data(self, soup, url):
+    def mark_article_unchanged(self, url, etag, last_modified, content_hash=None):
+        """Refresh validators and scrape date (and the page hash, if it changed) for an article whose content did not change"""
+        self.metrics.increment('articles_unchanged')
+        self.run_write(self.write_article_unchanged, url, etag, last_modified, content_hash)
+    
+    def write_article_unchanged(self, cursor, url, etag, last_modified, content_hash=None):
+        """SQL for mark_article_unchanged"""
+        for table in ('articles', 'article_duplicates'):
+            cursor.execute(f'''
+                UPDATE {table} SET etag = ?, last_modified = ?, content_hash = COALESCE(?, content_hash), scraped_date = ?
+                WHERE url = ?
+            ''', (etag, last_modified, content_hash, datetime.now(), url))
+    
+    def extract_article_data(self, doc, url):
         """Extract all relevant data from an article"""
+        netloc = urlparse(url).netloc
+        
+        # Title, meta, links, images and headings come from one walk; the
+        # tree is never modified, so the order of these calls does not matter
+        page = self.scan_page(doc, netloc)
+        
         data = {
             'url': url,
-            'title': self.extract_title(soup),
-            'content': self.extract_content(soup),
-            'meta_description': self.extract_meta_description(soup),
+            'title': page['title'],
+            'content': self.extract_content(doc),
+            'meta_description': page['meta_description'],
             'word_count': 0,
-            'headline_structure': '',
+            'headline_structure': page['headline_structure'],
             'keywords': [],
-            'internal_links': len(soup.find_all('a', href=lambda x: x and urlparse(url).netloc in x)),
-            'external_links': len(soup.find_all('a', href=lambda x: x and urlparse(url).netloc not in x)),
-            'images_count': len(soup.find_all('img')),
-            'source_domain': urlparse(url).netloc,
+            'internal_links': page['internal_links'],
+            'external_links': page['external_links'],
+            'images_count': page['images_count'],
+            'source_domain': netloc,
             'scraped_date': datetime.now()
         }
         
@@ -241,28 +3006,107 @@ class HealthContentScraper:
         if data['content']:
             data['word_count'] = len(data['content'].split())
         
-        # Extract keywords
-        data['keywords'] = self.extract_keywords(data['content'])
+        # Extract keywords, keeping every term's count for the keyword index
+        data['term_counts'] = self.keyword_analyzer.term_counts(data['content']) if data['content'] else Counter()
+        data['keywords'] = self.keyword_analyzer.top_terms(data['term_counts'])
         
-        # Analyze headline structure
-        data['headline_structure'] = self.analyze_headline_structure(soup)
+        data['body_hash'], data['simhash'] = self.content_fingerprint(data['content'])
         
         return data
     
-    def extract_title(self, soup):
+    def content_fingerprint(self, content):
+        """
+        (body_hash, simhash) of article text: SHA-256 of its normalized words and
+        a 64-bit SimHash of its 3-word shingles (None when there are too few)
+        """
+        words = re.findall(r'\w+', content.lower())
+        if not words:
+            return None, None
+        body_hash = hashlib.sha256(' '.join(words).encode('utf-8')).hexdigest()
+        
+        shingles = {' '.join(words[i:i + 3]) for i in range(len(words) - 2)}
+        if len(shingles) < self.min_shingles:
+            return body_hash, None
+        
+        # Tally each byte position's values across all shingle hashes, then
+        # add every distinct byte's bit pattern to the lane accumulator once
+        digests = b''.join(
+            hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest() for shingle in shingles
+        )
+        counts = 0
+        for position, lanes in enumerate(SIMHASH_LANES):
+            for byte, occurrences in Counter(digests[position::8]).items():
+                counts += lanes[byte] * occurrences
+        
+        half = len(shingles) / 2
+        simhash = 0
+        for lane in range(64):
+            if (counts >> (32 * lane)) & 0xFFFFFFFF > half:
+                simhash |= 1 << lane
+        return body_hash, simhash
+    
+    def scan_page(self, doc, netloc):
+        """
+        Collect title, meta description, link and image counts and heading
+        structure in a single walk. Links and images only count outside
+        CONTENT_SKIP_TAGS (navigation menus would swamp them); headings and
+        the title come from the whole page, as in analyze_headline_structure.
+        """
+        h1 = title = meta = None
+        internal_links = external_links = images_count = 0
+        headings = []
+        
+        for tag, element, skipped in doc.collect(SCAN_TAGS, CONTENT_SKIP_TAGS):
+            if tag == 'a':
+                href = doc.attr(element, 'href')
+                if href and not skipped:
+                    if netloc in href:
+                        internal_links += 1
+                    else:
+                        external_links += 1
+            elif tag == 'img':
+                if not skipped:
+                    images_count += 1
+            elif tag == 'title':
+                if title is None:
+                    title = element
+            elif tag == 'meta':
+                if meta is None and doc.attr(element, 'name') == 'description':
+                    meta = element
+            elif tag in HEADING_TAGS:
+                if tag == 'h1' and h1 is None:
+                    h1 = element
+                headings.append({
+                    'level': int(tag[1]),
+                    'text': doc.text(element).strip()
+                })
+        
+        # Same ordering as analyze_headline_structure: by level, then document order
+        headings.sort(key=lambda heading: heading['level'])
+        
+        title_element = h1 if h1 is not None else title
+        return {
+            'title': doc.text(title_element).strip() if title_element is not None else "",
+            'meta_description': doc.attr(meta, 'content', '') if meta is not None else "",
+            'internal_links': internal_links,
+            'external_links': external_links,
+            'images_count': images_count,
+            'headline_structure': json.dumps(headings)
+        }
+    
+    def extract_title(self, doc):
         """Extract article title"""
         title_tags = ['h1', 'title']
         for tag in title_tags:
-            element = soup.find(tag)
-            if element:
-                return element.get_text().strip()
+            element = doc.find(tag)
+            if element is not None:
+                return doc.text(element).strip()
         return ""
     
-    def extract_content(self, soup):
-        """Extract main article content"""
-        # Remove script and style elements
-        for script in soup(["script", "style", "nav", "footer", "header"]):
-            script.decompose()
+    def extract_content(self, doc):
+        """Extract main article content without modifying the parsed page"""
+        # Script, style and page furniture are skipped rather than removed,
+        # so the same parsed page can feed every other extraction step
         
         # Try common article containers
         article_selectors = [
@@ -274,18 +3118,18 @@ class HealthContentScraper:
         ]
         
         for selector in article_selectors:
-            content = soup.select_one(selector)
-            if content:
-                return content.get_text(separator=' ', strip=True)
+            content = doc.select_one(selector, skip_tags=CONTENT_SKIP_TAGS)
+            if content is not None:
+                return doc.text(content, separator=' ', strip=True, skip_tags=CONTENT_SKIP_TAGS)
         
         # Fallback to body
-        return soup.get_text(separator=' ', strip=True)
+        return doc.text(doc.root, separator=' ', strip=True, skip_tags=CONTENT_SKIP_TAGS)
     
-    def extract_meta_description(self, soup):
+    def extract_meta_description(self, doc):
         """Extract meta description"""
-        meta = soup.find('meta', attrs={'name': 'description'})
-        if meta:
-            return meta.get('content', '')
+        for meta in doc.find_all('meta'):
+            if doc.attr(meta, 'name') == 'description':
+                return doc.attr(meta, 'content', '')
         return ""
     
     def extract_keywords(self, text):
@@ -293,21 +3137,17 @@ class HealthContentScraper:
         if not text:
             return []
         
-        # Simple keyword extraction (can be enhanced with NLP)
-        words = re.findall(r'\b[a-z]{4,}\b', text.lower())
-        word_freq = Counter(words)
-        
-        # Return top 20 keywords
-        return [word for word, freq in word_freq.most_common(20)]
+        # Top 20 words, stopwords left out; see KeywordBatchAnalyzer for whole batches
+        return self.keyword_analyzer.keywords(text)
     
-    def analyze_headline_structure(self, soup):
+    def analyze_headline_structure(self, doc):
         """Analyze headline structure and hierarchy"""
         headings = []
         for i in range(1, 7):
-            for heading in soup.find_all(f'h{i}'):
+            for heading in doc.find_all(f'h{i}'):
                 headings.append({
                     'level': i,
-                    'text': heading.get_text().strip()
+                    'text': doc.text(heading).strip()
                 })
         return json.dumps(headings)
     
@@ -319,126 +3159,750 @@ class HealthContentScraper:
             'power_words': [],
             'persuasion_elements': [],
             'cta_elements': [],
-            'social_proof': []
+            'social_proof': [],
+            'pattern_hits': {}
         }
         
         content = article_data.get('content', '')
         title = article_data.get('title', '')
         
-        # Emotional analysis
-        if content:
-            blob = TextBlob(content)
-            analysis['emotional_score'] = blob.sentiment.polarity
-        
-        # Power words detection
-        power_words = [
-            'proven', 'guaranteed', 'exclusive', 'limited', 'secret',
-            'amazing', 'revolutionary', 'breakthrough', 'discover',
-            'transform', 'ultimate', 'essential', 'powerful', 'effective'
-        ]
-        
-        found_power_words = [word for word in power_words if word in content.lower()]
-        analysis['power_words'] = found_power_words
-        
-        # CTA detection
-        cta_patterns = [
-            r'click here',
-            r'learn more',
-            r'get started',
-            r'buy now',
-            r'shop now',
-            r'sign up',
-            r'subscribe',
-            r'download',
-            r'try now'
-        ]
+        lowered = content.lower()
         
-        for pattern in cta_patterns:
-            if re.search(pattern, content.lower()):
-                analysis['cta_elements'].append(pattern)
-        
-        # Social proof detection
-        social_proof_patterns = [
-            r'\d+\s+(people|users|customers)',
-            r'testimonial',
-            r'review',
-            r'rated',
-            r'trusted by'
-        ]
+        # Emotional analysis, reusing the score of an identical body when there is one
+        if article_data.get('cached_polarity') is not None:
+            analysis['emotional_score'] = article_data['cached_polarity']
+        elif content:
+            words = SENTIMENT_TOKEN.findall(lowered) if self.sentiment.uses_words else None
+            analysis['emotional_score'] = self.sentiment.polarity(content, words)
         
-        for pattern in social_proof_patterns:
-            matches = re.findall(pattern, content.lower())
-            if matches:
-                analysis['social_proof'].extend(matches)
+        # Power words, CTAs and social proof in one scan of the lowercased text
+        hits = ANALYSIS_MATCHER.scan(lowered)
+        analysis['pattern_hits'] = {pattern: len(found) for pattern, found in hits.items()}
+        analysis['power_words'] = [word for word in POWER_WORDS if word in hits]
+        analysis['cta_elements'] = [pattern for pattern in CTA_PATTERNS if pattern in hits]
+        for pattern in SOCIAL_PROOF_PATTERNS:
+            analysis['social_proof'].extend(match for _, match in hits.get(pattern, ()))
         
         return analysis
     
     def store_article(self, article_data, analysis):
         """Store article and analysis in database"""
+        self.metrics.increment('articles_stored')
+        self.run_write(self.write_article, article_data, analysis)
+    
+    def store_duplicate(self, article_data, canonical_url, distance):
+        """Record a URL whose body duplicates an already stored article"""
+        self.metrics.increment('articles_duplicate')
+        self.run_write(self.write_duplicate, article_data, canonical_url, distance)
+    
+    async def recheck_duplicates_of(self, url, depth):
+        """Download the URLs recorded as duplicates of url in full again, as its body changed"""
+        for duplicate_url in await self.run_read(self.read_duplicates_of, url):
+            self.metrics.increment('duplicate_rechecks')
+            self.duplicate_rechecks.add(duplicate_url)
+            if self.frontier is not None:
+                await self.frontier.revisit(duplicate_url, 'article', self.crawl_priority('article', depth), depth)
+    
+    def read_duplicates_of(self, conn, url):
+        """URLs whose stored duplicate row names url as their canonical article"""
+        return [row[0] for row in conn.execute('SELECT url FROM article_duplicates WHERE canonical_url = ?', (url,))]
+    
+    def write_duplicate(self, cursor, article_data, canonical_url, distance):
+        """
+        SQL for store_duplicate. A URL stored as an article until now loses its
+        article and the duplicate rows of other URLs that matched it.
+        """
+        self.write_article_removed(cursor, article_data['url'])
+        cursor.execute('''
+            INSERT OR REPLACE INTO article_duplicates
+            (url, canonical_url, distance, etag, last_modified, content_hash, scraped_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            article_data['url'],
+            canonical_url,
+            distance,
+            article_data.get('etag'),
+            article_data.get('last_modified'),
+            article_data.get('content_hash'),
+            article_data['scraped_date']
+        ))
+    
+    def write_article_removed(self, cursor, url):
+        """SQL to delete a stored article with its body, postings, headlines, revisions and fingerprint"""
+        cursor.execute('DELETE FROM content_fingerprints WHERE url = ?', (url,))
+        cursor.execute('DELETE FROM article_duplicates WHERE canonical_url = ?', (url,))
+        row = cursor.execute('SELECT id FROM articles WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            return
+        
+        article_id = row[0]
+        self.keyword_index.write(cursor, article_id, {}, None)
+        for table in ('article_bodies', 'headlines', 'article_revisions'):
+            cursor.execute(f'DELETE FROM {table} WHERE article_id = ?', (article_id,))
+        cursor.execute('DELETE FROM articles WHERE id = ?', (article_id,))
+    
+    def write_article(self, cursor, article_data, analysis):
+        """
+        SQL for store_article: insert or update the article row (keeping its id),
+        its compressed body and its headline analysis, and record the version it
+        replaces when the body changed
+        """
+        previous = cursor.execute('''
+            SELECT a.id, a.title, a.word_count, a.content_hash, f.body_hash, a.scraped_date, a.content
+            FROM articles a LEFT JOIN content_fingerprints f ON f.url = a.url
+            WHERE a.url = ?
+        ''', (article_data['url'],)).fetchone()
+        if previous is not None and previous[4] != article_data.get('body_hash'):
+            self.write_revision(cursor, previous, article_data['content'])
+            # Duplicates of the old body are downloaded again (see recheck_duplicates_of)
+            cursor.execute('DELETE FROM article_duplicates WHERE canonical_url = ?', (article_data['url'],))
+        
+        # Upsert article; the body goes to the content store, not the content column
+        cursor.execute('''
+            INSERT INTO articles
+            (url, title, content, meta_description, word_count, headline_structure,
+             keywords, internal_links, external_links, images_count, scraped_date, source_domain,
+             etag, last_modified, content_hash)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (url) DO UPDATE SET
+                title = excluded.title, content = excluded.content,
+                meta_description = excluded.meta_description, word_count = excluded.word_count,
+                headline_structure = excluded.headline_structure, keywords = excluded.keywords,
+                internal_links = excluded.internal_links, external_links = excluded.external_links,
+                images_count = excluded.images_count, scraped_date = excluded.scraped_date,
+                source_domain = excluded.source_domain, etag = excluded.etag,
+                last_modified = excluded.last_modified, content_hash = excluded.content_hash
+        ''', (
+            article_data['url'],
+            article_data['title'],
+            None,
+            article_data['meta_description'],
+            article_data['word_count'],
+            article_data['headline_structure'],
+            json.dumps(article_data['keywords']),
+            article_data['internal_links'],
+            article_data['external_links'],
+            article_data['images_count'],
+            article_data['scraped_date'],
+            article_data['source_domain'],
+            article_data.get('etag'),
+            article_data.get('last_modified'),
+            article_data.get('content_hash')
+        ))
+        
+        article_id = previous[0] if previous is not None else cursor.lastrowid
+        self.content_store.write(cursor, article_id, article_data['content'])
+        self.keyword_index.write(cursor, article_id, article_data.get('term_counts') or {}, article_data['scraped_date'])
+        
+        # Fingerprint for duplicate detection; the URL is no longer someone's duplicate
+        simhash = article_data.get('simhash')
+        if simhash is not None and simhash >= 1 << 63:
+            simhash -= 1 << 64      # SQLite integers are signed 64-bit
+        cursor.execute('''
+            INSERT OR REPLACE INTO content_fingerprints (url, body_hash, simhash)
+            VALUES (?, ?, ?)
+        ''', (article_data['url'], article_data.get('body_hash'), simhash))
+        cursor.execute('DELETE FROM article_duplicates WHERE url = ?', (article_data['url'],))
+        
+        if article_data.get('body_hash') and article_data.get('cached_polarity') is None:
+            cursor.execute('''
+                INSERT OR REPLACE INTO sentiment_scores (body_hash, backend, polarity)
+                VALUES (?, ?, ?)
+            ''', (article_data['body_hash'], self.sentiment_backend, analysis['emotional_score']))
+        
+        # Replace headline analysis
+        cursor.execute('DELETE FROM headlines WHERE article_id = ?', (article_id,))
+        cursor.execute('''
+            INSERT INTO headlines 
+            (headline, word_count, power_words, emotional_score, article_id)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (
+            article_data['title'],
+            len(article_data['title'].split()),
+            json.dumps(analysis['power_words']),
+            analysis['emotional_score'],
+            article_id
+        ))
+    
+    def write_revision(self, cursor, previous, new_content):
+        """Save the version of an article about to be overwritten, as a delta from its new body"""
+        article_id, title, word_count, content_hash, body_hash, scraped_date, legacy_content = previous
+        old_content = self.content_store.read(cursor.connection, article_id)
+        if old_content is None:
+            old_content = legacy_content
+        
+        codec = dictionary_id = delta = None
+        if old_content is not None:
+            codec = self.content_store.codec
+            dictionary_id, delta = self.content_store.compress(json.dumps(body_delta(new_content, old_content)))
+        cursor.execute('''
+            INSERT INTO article_revisions
+            (article_id, title, word_count, content_hash, body_hash, scraped_date, replaced_date,
+             codec, dictionary_id, delta)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (article_id, title, word_count, content_hash, body_hash, scraped_date, datetime.now(),
+              codec, dictionary_id, delta))
+        self.metrics.increment('article_revisions')
+    
+    def get_article_history(self, url):
+        """
+        Every stored version of an article, newest first, as dicts with title,
+        word_count, scraped_date and content (None where it could not be rebuilt)
+        """
+        conn = sqlite3.connect(self.db_path)
+        try:
+            row = conn.execute(
+                'SELECT id, title, word_count, scraped_date FROM articles WHERE url = ?', (url,)
+            ).fetchone()
+            if row is None:
+                return []
+            article_id, title, word_count, scraped_date = row
+            content = self.get_article_content(url)
+            history = [{'title': title, 'word_count': word_count, 'scraped_date': scraped_date, 'content': content}]
+            
+            for title, word_count, scraped_date, codec, dictionary_id, delta in conn.execute('''
+                SELECT title, word_count, scraped_date, codec, dictionary_id, delta
+                FROM article_revisions WHERE article_id = ? ORDER BY id DESC
+            ''', (article_id,)):
+                if content is not None and delta is not None:
+                    content = apply_body_delta(content, json.loads(
+                        self.content_store.decompress(conn, codec, dictionary_id, delta)
+                    ))
+                else:
+                    content = None
+                history.append({'title': title, 'word_count': word_count, 'scraped_date': scraped_date,
+                                'content': content})
+            return history
+        finally:
+            conn.close()
+    
+    def get_tfidf_keywords(self, url, top_k=20):
+        """An article's top_k (term, tf-idf) pairs from the keyword index"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            row = conn.execute('SELECT id FROM articles WHERE url = ?', (url,)).fetchone()
+            if row is None:
+                return []
+            return self.keyword_index.article_keywords(conn, row[0], top_k)
+        finally:
+            conn.close()
+    
+    def top_articles_for_term(self, term, limit=10):
+        """(url, title, tf-idf) of the articles where a term weighs most"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return self.keyword_index.top_articles(conn, term.lower(), limit)
+        finally:
+            conn.close()
+    
+    def get_rising_terms(self, days=7, limit=20, min_articles=3):
+        """Terms appearing in more articles over the last `days` days than the `days` before"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            return self.keyword_index.rising_terms(conn, days, limit, min_articles)
+        finally:
+            conn.close()
+    
+    def run_write(self, write_func, *args):
+        """Send a write to the batching writer, or apply it directly when no crawl is running"""
+        if self.writer is not None:
+            self.writer.submit(write_func, *args)
+            return
+        
+        started = time.monotonic()
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
         try:
-            # Insert article
-            cursor.execute('''
-                INSERT OR REPLACE INTO articles 
-                (url, title, content, meta_description, word_count, headline_structure,
-                 keywords, internal_links, external_links, images_count, scraped_date, source_domain)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                article_data['url'],
-                article_data['title'],
-                article_data['content'],
-                article_data['meta_description'],
-                article_data['word_count'],
-                article_data['headline_structure'],
-                json.dumps(article_data['keywords']),
-                article_data['internal_links'],
-                article_data['external_links'],
-                article_data['images_count'],
-                article_data['scraped_date'],
-                article_data['source_domain']
-            ))
-            
-            article_id = cursor.lastrowid
-            
-            # Insert headline analysis
-            cursor.execute('''
-                INSERT INTO headlines 
-                (headline, word_count, power_words, emotional_score, article_id)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (
-                article_data['title'],
-                len(article_data['title'].split()),
-                json.dumps(analysis['power_words']),
-                analysis['emotional_score'],
-                article_id
-            ))
-            
+            write_func(cursor, *args)
             conn.commit()
+            self.metrics.observe('db_batch', time.monotonic() - started)
+            self.metrics.increment('db_writes')
             
         except Exception as e:
-            print(f"Error storing article: {str(e)}")
+            print(f"Error in database write {write_func.__name__}: {str(e)}")
             conn.rollback()
         
         finally:
             conn.close()
     
-    async def run_mass_scraping(self):
-        """Execute mass scraping operation"""
+    def create_session(self):
+        """Build the crawl's aiohttp session from connector_config, with pool statistics tracing"""
+        config = self.connector_config
+        connector = aiohttp.TCPConnector(
+            limit=config['limit'],
+            # A replay server stands in for every host; the frontier still paces each one
+            limit_per_host=0 if self.replay_url else config['limit_per_host'],
+            keepalive_timeout=config['keepalive_timeout'],
+            use_dns_cache=True,
+            ttl_dns_cache=config['dns_cache_ttl'],
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=config['total_timeout'],
+            sock_connect=config['connect_timeout'],
+            sock_read=config['read_timeout'],
+        )
+        return aiohttp.ClientSession(connector=connector, timeout=timeout, trace_configs=[self.pool_trace_config()])
+    
+    def pool_trace_config(self):
+        """aiohttp trace hooks that count new, reused and queued connections and DNS cache use"""
+        stats = self.pool_stats = {
+            'connections_created': 0,
+            'connections_reused': 0,
+            'connect_seconds': 0.0,
+            'queued_for_connection': 0,
+            'queue_wait_seconds': 0.0,
+            'dns_cache_hits': 0,
+            'dns_cache_misses': 0,
+        }
+        
+        async def on_queued_start(session, context, params):
+            context.queued_at = time.monotonic()
+        
+        async def on_queued_end(session, context, params):
+            stats['queued_for_connection'] += 1
+            stats['queue_wait_seconds'] += time.monotonic() - context.queued_at
+        
+        async def on_create_start(session, context, params):
+            context.connect_started = time.monotonic()
+        
+        async def on_create_end(session, context, params):
+            stats['connections_created'] += 1
+            stats['connect_seconds'] += time.monotonic() - context.connect_started
+        
+        async def on_reuse(session, context, params):
+            stats['connections_reused'] += 1
+        
+        async def on_dns_hit(session, context, params):
+            stats['dns_cache_hits'] += 1
+        
+        async def on_dns_miss(session, context, params):
+            stats['dns_cache_misses'] += 1
+        
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_queued_start.append(on_queued_start)
+        trace_config.on_connection_queued_end.append(on_queued_end)
+        trace_config.on_connection_create_start.append(on_create_start)
+        trace_config.on_connection_create_end.append(on_create_end)
+        trace_config.on_connection_reuseconn.append(on_reuse)
+        trace_config.on_dns_cache_hit.append(on_dns_hit)
+        trace_config.on_dns_cache_miss.append(on_dns_miss)
+        return trace_config
+    
+    def owns_host(self, host):
+        """True if this scraper's shard crawls the host"""
+        return self.shard_count == 1 or shard_for_host(host, self.shard_count) == self.shard_index
+    
+    def hand_off_url(self, url, kind, priority, depth):
+        """Pass a URL on a host this shard does not own to the shard that does"""
+        self.handoff.send(shard_for_host(urlsplit(url).netloc, self.shard_count), url, kind, priority, depth)
+        self.metrics.increment('handed_off')
+    
+    async def receive_handoffs(self):
+        """Queue URLs other shards found on this shard's hosts"""
+        rows = self.handoff.receive(self.shard_index)
+        for url, kind, priority, depth in rows:
+            await self.frontier.put(url, kind, priority, depth=depth)
+        self.metrics.increment('received_handoffs', len(rows))
+    
+    async def exchange_handoffs(self):
+        """Send buffered handoffs and pick up incoming ones every handoff_interval seconds until cancelled"""
+        while True:
+            await asyncio.sleep(self.handoff_interval)
+            try:
+                self.handoff.flush()
+                if not self.frontier.closed:
+                    await self.receive_handoffs()
+            except sqlite3.Error as e:
+                print(f"Could not exchange shard handoffs: {str(e)}")
+    
+    def merge_shard(self, shard_path):
+        """
+        Copy a shard database's articles, with their bodies, headlines, fingerprints
+        and duplicate links, into this scraper's database. Only rows scraped since
+        that shard's previous merge are copied; returns the number of articles merged.
+        """
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute('ATTACH DATABASE ? AS shard', (shard_path,))
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS shard_merges (
+                    shard_path TEXT PRIMARY KEY,
+                    merged_until TIMESTAMP
+                )
+            ''')
+            row = conn.execute('SELECT merged_until FROM shard_merges WHERE shard_path = ?', (shard_path,)).fetchone()
+            since = row[0] if row else ''
+            
+            conn.execute('DROP TABLE IF EXISTS temp.merge_urls')
+            conn.execute('''
+                CREATE TEMP TABLE merge_urls AS
+                SELECT id AS shard_id, url FROM shard.articles WHERE scraped_date > ?
+            ''', (since,))
+            merged = conn.execute('SELECT COUNT(*) FROM temp.merge_urls').fetchone()[0]
+            
+            # Merged articles get the shard's headline analysis and keyword postings in place of their current ones
+            for table in ('headlines', 'keywords'):
+                conn.execute(f'''
+                    DELETE FROM main.{table} WHERE article_id IN (
+                        SELECT a.id FROM main.articles a JOIN temp.merge_urls m ON m.url = a.url
+                    )
+                ''')
+            
+            # Upsert so articles already here keep their ids
+            main_columns = [row[1] for row in conn.execute('PRAGMA main.table_info(articles)')]
+            shard_columns = {row[1] for row in conn.execute('PRAGMA shard.table_info(articles)')}
+            columns = [column for column in main_columns if column not in ('id', 'url') and column in shard_columns]
+            updates = ', '.join(f"{column} = excluded.{column}" for column in columns)
+            columns = ', '.join(['url'] + columns)
+            conn.execute(f'''
+                INSERT INTO main.articles ({columns})
+                SELECT {columns} FROM shard.articles WHERE id IN (SELECT shard_id FROM temp.merge_urls)
+                ON CONFLICT (url) DO UPDATE SET {updates}
+            ''')
+            
+            # Bodies reference the shard's dictionary ids; reuse identical dictionaries already here
+            conn.execute('DROP TABLE IF EXISTS temp.dictionary_map')
+            conn.execute('CREATE TEMP TABLE dictionary_map (shard_id INTEGER PRIMARY KEY, main_id INTEGER)')
+            for shard_id, codec, data, created_date in conn.execute(
+                'SELECT id, codec, data, created_date FROM shard.content_dictionaries'
+            ).fetchall():
+                existing = conn.execute(
+                    'SELECT id FROM main.content_dictionaries WHERE codec = ? AND data = ?', (codec, data)
+                ).fetchone()
+                if existing is None:
+                    main_id = conn.execute(
+                        'INSERT INTO main.content_dictionaries (codec, data, created_date) VALUES (?, ?, ?)',
+                        (codec, data, created_date)
+                    ).lastrowid
+                else:
+                    main_id = existing[0]
+                conn.execute('INSERT INTO temp.dictionary_map VALUES (?, ?)', (shard_id, main_id))
+            
+            conn.execute('''
+                INSERT INTO main.article_revisions
+                (article_id, title, word_count, content_hash, body_hash, scraped_date, replaced_date,
+                 codec, dictionary_id, delta)
+                SELECT a.id, r.title, r.word_count, r.content_hash, r.body_hash, r.scraped_date, r.replaced_date,
+                       r.codec, d.main_id, r.delta
+                FROM shard.article_revisions r
+                JOIN shard.articles s ON s.id = r.article_id
+                JOIN main.articles a ON a.url = s.url
+                LEFT JOIN temp.dictionary_map d ON d.shard_id = r.dictionary_id
+                WHERE r.replaced_date > ?
+                ORDER BY r.id
+            ''', (since,))
+            conn.execute('''
+                INSERT OR REPLACE INTO main.article_bodies (article_id, codec, dictionary_id, raw_size, body)
+                SELECT a.id, b.codec, d.main_id, b.raw_size, b.body
+                FROM shard.article_bodies b
+                JOIN temp.merge_urls m ON m.shard_id = b.article_id
+                JOIN main.articles a ON a.url = m.url
+                LEFT JOIN temp.dictionary_map d ON d.shard_id = b.dictionary_id
+            ''')
+            conn.execute('''
+                INSERT INTO main.headlines (headline, word_count, power_words, emotional_score, click_potential, article_id)
+                SELECT h.headline, h.word_count, h.power_words, h.emotional_score, h.click_potential, a.id
+                FROM shard.headlines h
+                JOIN temp.merge_urls m ON m.shard_id = h.article_id
+                JOIN main.articles a ON a.url = m.url
+            ''')
+            conn.execute('''
+                INSERT INTO main.keywords (keyword, frequency, tf, added_date, article_id)
+                SELECT k.keyword, k.frequency, k.tf, k.added_date, a.id
+                FROM shard.keywords k
+                JOIN temp.merge_urls m ON m.shard_id = k.article_id
+                JOIN main.articles a ON a.url = m.url
+            ''')
+            self.keyword_index.rebuild_stats(conn)
+            conn.execute('''
+                INSERT OR IGNORE INTO main.sentiment_scores (body_hash, backend, polarity)
+                SELECT s.body_hash, s.backend, s.polarity
+                FROM shard.sentiment_scores s
+                JOIN shard.content_fingerprints f ON f.body_hash = s.body_hash
+                JOIN temp.merge_urls m ON m.url = f.url
+            ''')
+            conn.execute('''
+                INSERT OR REPLACE INTO main.content_fingerprints (url, body_hash, simhash)
+                SELECT f.url, f.body_hash, f.simhash
+                FROM shard.content_fingerprints f JOIN temp.merge_urls m ON m.url = f.url
+            ''')
+            conn.execute('''
+                INSERT OR REPLACE INTO main.article_duplicates
+                (url, canonical_url, distance, etag, last_modified, content_hash, scraped_date)
+                SELECT url, canonical_url, distance, etag, last_modified, content_hash, scraped_date
+                FROM shard.article_duplicates WHERE scraped_date > ?
+            ''', (since,))
+            
+            merged_until = conn.execute('''
+                SELECT MAX(scraped_date) FROM (
+                    SELECT scraped_date FROM shard.articles
+                    UNION ALL
+                    SELECT scraped_date FROM shard.article_duplicates
+                    UNION ALL
+                    SELECT replaced_date FROM shard.article_revisions
+                )
+            ''').fetchone()[0]
+            if merged_until:
+                conn.execute(
+                    'INSERT OR REPLACE INTO shard_merges (shard_path, merged_until) VALUES (?, ?)',
+                    (shard_path, max(merged_until, since))
+                )
+            conn.commit()
+        finally:
+            conn.close()
+        
+        return merged
+    
+    def metrics_snapshot(self):
+        """Current crawl metrics plus queue depths and connection pool statistics"""
+        snapshot = self.metrics.snapshot()
+        frontier = self.frontier
+        writer = self.writer
+        # A full parse queue means the crawl is CPU-bound; a growing write queue means SQLite is
+        snapshot['queues'] = {
+            'frontier_ready': sum(len(heap) for heap in frontier.ready.values()) if frontier else 0,
+            'frontier_delayed': sum(len(heap) for heap in frontier.delayed.values()) if frontier else 0,
+            'in_flight': frontier.active if frontier else 0,
+            'parse_waiting': self.metrics.parse_waiting,
+            'parse_running': self.metrics.parse_running,
+            'parse_capacity': self.parse_queue_size if self.parse_executor is not None else 0,
+            'write_queue': writer.queue.qsize() if writer else 0,
+        }
+        snapshot['connection_pool'] = dict(self.pool_stats)
+        return snapshot
+    
+    def write_metrics(self):
+        """Write a metrics snapshot to metrics_path, replacing the previous one atomically"""
+        temp_path = f"{self.metrics_path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(self.metrics_snapshot(), f, indent=2)
+        os.replace(temp_path, self.metrics_path)
+    
+    async def dump_metrics_periodically(self):
+        """Refresh the metrics file every metrics_interval seconds until cancelled"""
+        while True:
+            await asyncio.sleep(self.metrics_interval)
+            try:
+                self.write_metrics()
+            except OSError as e:
+                print(f"Could not write {self.metrics_path}: {str(e)}")
+    
+    def report_metrics(self):
+        """Print throughput, stage timings and errors for the last crawl"""
+        snapshot = self.metrics.snapshot()
+        throughput = snapshot['throughput']
+        print(f"Fetched {snapshot['counters'].get('pages', 0)} pages in {snapshot['elapsed_seconds']:.1f}s "
+              f"({throughput['pages_per_sec']:.1f} pages/s, {throughput['bytes_per_sec'] / 1024:.0f} KB/s)")
+        for stage, timing in sorted(snapshot['timings'].items()):
+            print(f"  {stage}: {timing['count']} x, p50 {timing['p50'] * 1000:.1f} ms, "
+                  f"p90 {timing['p90'] * 1000:.1f} ms, {timing['total']:.1f}s total")
+        if snapshot['errors']:
+            print("  Errors: " + ", ".join(f"{name} {count}" for name, count in sorted(snapshot['errors'].items())))
+    
+    def report_pool_stats(self):
+        """Print connection pool statistics for the last crawl"""
+        stats = self.pool_stats
+        if not stats:
+            return
+        
+        created = stats['connections_created']
+        requests = created + stats['connections_reused']
+        print("Connection pool:")
+        print(f"  Connections opened: {created}"
+              + (f" (avg connect {stats['connect_seconds'] / created * 1000:.0f} ms)" if created else ""))
+        print(f"  Connections reused: {stats['connections_reused']}"
+              + (f" ({stats['connections_reused'] / requests * 100:.0f}% of requests)" if requests else ""))
+        print(f"  Waited for a free connection: {stats['queued_for_connection']} times, "
+              f"{stats['queue_wait_seconds']:.1f}s total")
+        print(f"  DNS cache: {stats['dns_cache_hits']} hits, {stats['dns_cache_misses']} misses")
+    
+    async def crawl_worker(self, session):
+        """Pull URLs from the shared frontier until the crawl is finished"""
+        while True:
+            item = await self.frontier.get()
+            if item is None:
+                return
+            
+            url, kind, depth = item
+            try:
+                allowed = await self.allowed_by_robots(session, url)
+            except FetchError as e:
+                self.metrics.record_error(e.error_class)
+                await self.handle_fetch_error(url, kind, e)
+                continue
+            if not allowed:
+                self.metrics.record_error('robots_disallowed')
+                await self.frontier.task_done(url, 'failed', 'disallowed by robots.txt')
+                continue
+            
+            # A cancelled worker never finishes its URL, leaving it in_flight
+            # so the next run picks it up again
+            try:
+                if kind in ('site', 'page'):
+                    ok = await self.scrape_site(session, url, depth=depth) is not None
+                elif kind == 'sitemap':
+                    ok = await self.scrape_sitemap(session, url) is not None
+                else:
+                    ok = await self.scrape_article(session, url, depth)
+            except FetchError as e:
+                self.metrics.record_error(e.error_class)
+                await self.handle_fetch_error(url, kind, e)
+                continue
+            
+            if not ok:
+                # Parsing the same body fails the same way, so retry_failures skips these
+                self.metrics.record_error('processing')
+                self.frontier.record_failure(url, kind, 'processing failed', retryable=False)
+            await self.frontier.task_done(url, 'done' if ok else 'failed')
+    
+    async def handle_fetch_error(self, url, kind, error):
+        """Queue a transient failure for another attempt, or give up and record it in the ledger"""
+        attempt = self.frontier.attempts.get(url, 0) + 1
+        if error.retryable and attempt <= self.max_retries:
+            self.metrics.increment('retries')
+            await self.frontier.retry(url, kind, str(error), max(self.retry_delay(attempt), error.retry_after or 0))
+            return
+        
+        print(f"Error scraping {url}: {error} (attempt {attempt})")
+        self.frontier.record_failure(url, kind, str(error), error.status, error.retryable)
+        await self.frontier.task_done(url, 'failed', str(error))
+    
+    def retry_delay(self, attempt):
+        """Full-jitter exponential backoff: a random delay up to retry_backoff * 2^(attempt - 1)"""
+        return random.uniform(0, min(self.max_retry_delay, self.retry_backoff * 2 ** (attempt - 1)))
+    
+    async def run_mass_scraping(self, retry_failures=False, time_budget=None, handoffs_only=False):
+        """Execute mass scraping operation.
+        With retry_failures, only the retryable URLs in the failure ledger are crawled again.
+        With a time_budget in seconds, the crawl stops when it runs out and the
+        next run resumes from the URLs still queued.
+        With handoffs_only, a shard crawls just the URLs other shards handed it."""
         print("Starting mass content scraping...")
         print(f"Target sites: {len(self.target_sites)}")
+        print(f"Workers: {self.max_concurrency} (max {self.per_host_limit} per host)")
+        
+        owns_host = handoff = None
+        if self.shard_count > 1:
+            print(f"Shard {self.shard_index + 1} of {self.shard_count}")
+            owns_host = self.owns_host
+            if self.handoff_path:
+                self.handoff = ShardHandoff(self.handoff_path)
+                handoff = self.hand_off_url
+            else:
+                handoff = lambda url, kind, priority, depth: None
+        
+        self.metrics = CrawlMetrics()
+        self.writer = ArticleWriter(self.db_path, self.write_batch_size, self.write_flush_interval, self.metrics)
+        self.writer.start()
         
-        async with aiohttp.ClientSession() as session:
-            tasks = []
+        self.frontier = CrawlFrontier(self.per_host_limit, self.rate_limiter, db_path=self.db_path,
+                                      host_budget=self.site_page_budget, owns_host=owns_host, handoff=handoff,
+                                      writer=self.writer)
+        # A handoffs-only rerun extends the shard's last crawl, so its links are not fetched twice
+        resumed = self.frontier.load(continue_crawl=handoffs_only)
+        if resumed:
+            print(f"Resuming interrupted crawl: {resumed} URLs still queued")
+        
+        if self.handoff is not None:
+            await self.receive_handoffs()
+        
+        if handoffs_only:
+            pass
+        elif retry_failures:
+            failed = self.frontier.failed_urls()
+            print(f"Retrying {len(failed)} failed URLs")
+            for url, kind in failed:
+                # Retried articles and pages do not start a new BFS below them
+                depth = 0 if kind in ('site', 'sitemap') else self.max_depth
+                await self.frontier.put(url, kind, self.crawl_priority(kind, depth), depth=depth)
+        else:
+            # Site homepages go first so article discovery fills the frontier early
             for site in self.target_sites:
-                task = asyncio.create_task(self.scrape_site(session, site))
-                tasks.append(task)
-            
-            await asyncio.gather(*tasks)
+                site = self.normalize_url(site)
+                if self.owns_host(urlsplit(site).netloc):
+                    await self.frontier.put(site, 'site', self.crawl_priority('site', 0))
+        
+        # Shards also check against everything already merged from other shards
+        self.duplicates = DuplicateIndex(self.duplicate_distance)
+        self.duplicates.load(self.db_path)
+        if self.shared_db_path and os.path.exists(self.shared_db_path):
+            self.duplicates.load(self.shared_db_path)
         
+        self.lookup_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='article-lookup')
+        
+        if self.parse_processes > 0:
+            self.parse_executor = ProcessPoolExecutor(
+                max_workers=self.parse_processes,
+                initializer=init_parse_worker,
+                initargs=(self,)
+            )
+            # Start the workers before any connection opens: forked mid-crawl they would inherit
+            # open sockets, and a connection the crawler or a ReplayServer closes would stay open.
+            # Python 3.11+ forks every worker on the first submit; earlier versions fork one per
+            # submit while none is idle, so one no-op per worker, all queued at once, starts them all
+            warmup = [self.parse_executor.submit(os.getpid) for _ in range(self.parse_processes)]
+            await asyncio.gather(*(asyncio.wrap_future(future) for future in warmup))
+            self.parse_slots = asyncio.Semaphore(self.parse_queue_size)
+        
+        stop_timer = None
+        if time_budget:
+            frontier = self.frontier
+            stop_timer = asyncio.get_running_loop().call_later(
+                time_budget, lambda: asyncio.ensure_future(frontier.stop())
+            )
+        if self.record_path:
+            self.archive = ResponseArchive(self.record_path)
+        metrics_task = asyncio.create_task(self.dump_metrics_periodically())
+        handoff_task = asyncio.create_task(self.exchange_handoffs()) if self.handoff is not None else None
+        
+        try:
+            async with self.create_session() as session:
+                workers = [
+                    asyncio.create_task(self.crawl_worker(session))
+                    for _ in range(self.max_concurrency)
+                ]
+                await asyncio.gather(*workers)
+            
+            remaining = self.frontier.pending_count()
+            if remaining:
+                print(f"Time budget reached: {remaining} URLs left queued for the next run")
+        finally:
+            metrics_task.cancel()
+            if handoff_task is not None:
+                handoff_task.cancel()
+                self.handoff.close()
+                self.handoff = None
+            if stop_timer is not None:
+                stop_timer.cancel()
+            if self.archive is not None:
+                self.archive.close()
+                self.archive = None
+            if self.parse_executor is not None:
+                self.parse_executor.shutdown()
+                self.parse_executor = None
+                self.parse_slots = None
+            await asyncio.get_running_loop().run_in_executor(self.lookup_executor, self.close_lookup_connection)
+            self.lookup_executor.shutdown()
+            self.lookup_executor = None
+            self.frontier.close()
+            self.frontier = None
+            
+            # Flush pending article writes without stalling other tasks on the loop
+            await asyncio.get_running_loop().run_in_executor(None, self.writer.stop)
+            self.writer = None
+            self.duplicates = None
+            
+            try:
+                self.write_metrics()
+            except OSError as e:
+                print(f"Could not write {self.metrics_path}: {str(e)}")
         print("Mass scraping completed!")
-        self.generate_insights()
+        self.report_metrics()
+        self.report_pool_stats()
+        # Shards leave insights to whoever merges them; replayed crawls are only benchmarks
+        if self.shard_count == 1 and not self.replay_url:
+            self.generate_insights()
     
     def generate_insights(self):
         """Generate insights from scraped data"""
@@ -455,16 +3919,9 @@ class HealthContentScraper:
         
         top_headlines = cursor.fetchall()
         
-        # Most common keywords
-        cursor.execute('''
-            SELECT keywords, COUNT(*) as frequency
-            FROM articles
-            GROUP BY keywords
-            ORDER BY frequency DESC
-            LIMIT 100
-        ''')
-        
-        common_keywords = cursor.fetchall()
+        # Terms found in the most articles, and those spreading fastest this week
+        common_keywords = self.keyword_index.top_terms(conn, 100)
+        rising_terms = self.keyword_index.rising_terms(conn)
         
         # Average article metrics
         cursor.execute('''
@@ -484,6 +3941,7 @@ class HealthContentScraper:
         insights = {
             'top_headlines': [h[0] for h in top_headlines],
             'common_keywords': common_keywords,
+            'rising_terms': rising_terms,
             'average_metrics': {
                 'word_count': avg_metrics[0],
                 'internal_links': avg_metrics[1],
@@ -498,7 +3956,126 @@ class HealthContentScraper:
         
         print("Insights generated and saved to content_insights.json")
 
+def run_shard(shard_index, shard_count, db_path, options, handoffs_only=False):
+    """Crawl one shard into its own database (entry point for each shard process)"""
+    scraper = HealthContentScraper(db_path=shard_db_path(db_path, shard_index, shard_count),
+                                   shard_index=shard_index, shard_count=shard_count,
+                                   shared_db_path=db_path, **options)
+    asyncio.run(scraper.run_mass_scraping(handoffs_only=handoffs_only))
+
+def merge_shards(shard_count, db_path="content_intelligence.db"):
+    """Merge every shard database into db_path and regenerate insights"""
+    scraper = HealthContentScraper(db_path=db_path)
+    for shard_index in range(shard_count):
+        shard_path = shard_db_path(db_path, shard_index, shard_count)
+        if not os.path.exists(shard_path):
+            print(f"No database for shard {shard_index + 1} of {shard_count} at {shard_path}")
+            continue
+        merged = scraper.merge_shard(shard_path)
+        print(f"Merged {merged} articles from {shard_path}")
+    scraper.generate_insights()
+
+def run_sharded_crawl(shard_count, db_path="content_intelligence.db", max_rounds=3, **scraper_options):
+    """
+    Crawl with one process per shard on this machine, then merge the shards
+    into db_path. A shard that finished before another shard handed it URLs
+    runs again on just those URLs, up to max_rounds crawls in all.
+    """
+    options = dict(scraper_options)
+    if options.get('parse_processes') is None:
+        options['parse_processes'] = max(1, (os.cpu_count() or 1) // shard_count)
+    if options.get('handoff_path') is None:
+        options['handoff_path'] = f"{os.path.splitext(db_path)[0]}.handoff.db"
+    
+    shards = range(shard_count)
+    for round_number in range(max_rounds):
+        processes = [
+            multiprocessing.Process(target=run_shard,
+                                    args=(shard_index, shard_count, db_path, options, round_number > 0),
+                                    name=f"crawl-shard-{shard_index}")
+            for shard_index in shards
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+            if process.exitcode != 0:
+                print(f"{process.name} exited with code {process.exitcode}")
+        
+        handoff = ShardHandoff(options['handoff_path'])
+        shards = sorted(handoff.waiting_shards())
+        handoff.close()
+        if not shards:
+            break
+        print(f"Shards {[shard + 1 for shard in shards]} have handed-off URLs waiting")
+    
+    merge_shards(shard_count, db_path)
+
+async def replay_crawl(archive_path, db_path="replay_benchmark.db", server_options=None, **scraper_options):
+    """
+    Benchmark the crawl pipeline offline: serve a recorded archive from a local
+    ReplayServer (server_options set its latency and fault injection) and crawl
+    it into a fresh db_path. Returns the crawl's metrics snapshot.
+    """
+    archive = ResponseArchive(archive_path)
+    print(f"Replaying {archive.load()} archived responses from {archive_path}")
+    
+    # Start from an empty database so every run crawls the same pages
+    for path in (db_path, f"{db_path}-wal", f"{db_path}-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+    
+    server = ReplayServer(archive, **(server_options or {}))
+    replay_url = await server.start()
+    try:
+        scraper = HealthContentScraper(db_path=db_path, replay_url=replay_url, **scraper_options)
+        scraper.metrics_path = f"{os.path.splitext(db_path)[0]}.metrics.json"
+        await scraper.run_mass_scraping()
+    finally:
+        await server.stop()
+    
+    print(f"Replay server: {dict(server.stats)}")
+    return scraper.metrics_snapshot()
+
 # Main execution
 if __name__ == "__main__":
-    scraper = HealthContentScraper()
-    asyncio.run(scraper.run_mass_scraping())
\ No newline at end of file
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Scrape health content sites")
+    parser.add_argument('--db', default="content_intelligence.db", help="database results end up in")
+    parser.add_argument('--shards', type=int, help="crawl with this many shard processes on this machine")
+    parser.add_argument('--shard', help="run a single shard, as INDEX/COUNT (INDEX from 1), e.g. on one of several machines")
+    parser.add_argument('--handoff', help="handoff database shared by every shard (required with --shard)")
+    parser.add_argument('--merge', type=int, metavar='COUNT', help="merge COUNT shard databases into --db")
+    parser.add_argument('--record', metavar='ARCHIVE', help="save every fetched response to this .warc.gz archive")
+    parser.add_argument('--replay', metavar='ARCHIVE', help="benchmark offline against a recorded archive")
+    parser.add_argument('--latency', type=float, default=0.0, help="replay: seconds added to every response")
+    parser.add_argument('--jitter', type=float, default=0.0, help="replay: up to this many extra seconds per response")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="replay: fraction of requests answered with a 5xx")
+    parser.add_argument('--disconnect-rate', type=float, default=0.0,
+                        help="replay: fraction of responses cut off halfway through the body")
+    parser.add_argument('--seed', type=int, help="replay: seed for repeatable latency and faults")
+    args = parser.parse_args()
+    
+    if args.shards:
+        run_sharded_crawl(args.shards, db_path=args.db)
+    elif args.shard:
+        if not args.handoff:
+            parser.error("--shard needs --handoff")
+        index, count = (int(part) for part in args.shard.split('/'))
+        run_shard(index - 1, count, args.db, {'handoff_path': args.handoff})
+    elif args.merge:
+        merge_shards(args.merge, db_path=args.db)
+    elif args.replay:
+        server_options = {
+            'latency': args.latency,
+            'latency_jitter': args.jitter,
+            'error_rate': args.error_rate,
+            'disconnect_rate': args.disconnect_rate,
+            'seed': args.seed,
+        }
+        db_path = args.db if args.db != parser.get_default('db') else "replay_benchmark.db"
+        asyncio.run(replay_crawl(args.replay, db_path, server_options))
+    else:
+        scraper = HealthContentScraper(db_path=args.db, record_path=args.record)
+        asyncio.run(scraper.run_mass_scraping())
\ No newline at end of file
@@ -5,6 +5,8 @@ Creates a simple web-based dashboard to monitor system performance
 """
 
 import os
+import re
+import glob
 from flask import Flask, render_template_string
 import sqlite3
 from datetime import datetime, timedelta
@@ -13,6 +15,11 @@ import json
 # Create Flask app
 app = Flask(__name__)
 
+# Live metrics written by HealthContentScraper during a crawl; each shard of a
+# sharded crawl writes scraper_metrics.shard-<i>-of-<n>.json next to it instead
+SCRAPER_METRICS_PATH = '/opt/fueltheaura-ai/scraper_metrics.json'
+SHARD_METRICS_PATTERN = re.compile(r'\.shard-(\d+)-of-(\d+)\.json$')
+
 DASHBOARD_HTML = """
 <!DOCTYPE html>
 <html lang="en">
@@ -218,6 +225,23 @@ DASHBOARD_HTML = """
                 <div class="stat-label">Total storage used</div>
             </div>
 
+            <div class="stat-card">
+                <h3><span class="icon">📈</span> Scraper Throughput</h3>
+                {% if scraper %}
+                <div class="stat-value">{{ scraper.pages_per_sec }}</div>
+                <div class="stat-label">Pages/sec over the last minute ({{ scraper.kb_per_sec }} KB/s)</div>
+                <div class="stat-label" style="margin-top: 10px;">
+                    Fetch p90: {{ scraper.fetch_p90 }} ms | Parse p90: {{ scraper.parse_p90 }} ms | DB batch p90: {{ scraper.db_p90 }} ms
+                </div>
+                <div class="stat-label">
+                    Queued: {{ scraper.queued|format_number }} | Parse waiting: {{ scraper.parse_waiting }} | Write queue: {{ scraper.write_queue }} | Errors: {{ scraper.errors|format_number }}
+                </div>
+                <div class="stat-label">Updated: {{ scraper.updated }}{% if scraper.shards %} ({{ scraper.shards }} shards combined){% endif %}</div>
+                {% else %}
+                <div class="stat-label">No crawl metrics yet</div>
+                {% endif %}
+            </div>
+
             <div class="stat-card">
                 <h3><span class="icon">⚡</span> System Status</h3>
                 <div style="margin-top: 15px;">
@@ -369,9 +393,103 @@ def dashboard():
         stats=stats,
         recent_posts=recent_posts,
         categories=categories,
+        scraper=scraper_summary(load_scraper_metrics()),
         current_time=current_time
     )
 
+def read_metrics_file(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def load_scraper_metrics():
+    """
+    Latest scraper metrics snapshot, or None if no crawl has written one.
+    When a sharded crawl wrote the newest metrics, its shards' snapshots are
+    combined, with each one listed under 'shards'.
+    """
+    shard_paths = glob.glob(SCRAPER_METRICS_PATH[:-len('.json')] + '.shard-*-of-*.json')
+    crawls = {}
+    for path in [SCRAPER_METRICS_PATH] + sorted(shard_paths):
+        snapshot = read_metrics_file(path)
+        if snapshot is None:
+            continue
+        match = SHARD_METRICS_PATTERN.search(path)
+        shard_count = int(match.group(2)) if match else None
+        crawls.setdefault(shard_count, {})[os.path.basename(path)] = snapshot
+    
+    if not crawls:
+        return None
+    shard_count, snapshots = max(
+        crawls.items(), key=lambda crawl: max(s.get('timestamp', '') for s in crawl[1].values())
+    )
+    if shard_count is None:
+        return snapshots[os.path.basename(SCRAPER_METRICS_PATH)]
+    return combine_scraper_metrics(snapshots)
+
+def combine_scraper_metrics(snapshots):
+    """
+    One snapshot for a sharded crawl: counts and rates are summed, timing
+    counts and totals too; percentiles are the worst shard's, as shard
+    histograms cannot be merged from their summaries.
+    """
+    combined = {
+        'timestamp': max(s.get('timestamp', '') for s in snapshots.values()),
+        'elapsed_seconds': max(s.get('elapsed_seconds', 0) for s in snapshots.values()),
+        'timings': {},
+        'shards': snapshots,
+    }
+    for section in ('counters', 'throughput', 'statuses', 'errors', 'queues'):
+        totals = {}
+        for snapshot in snapshots.values():
+            for name, value in snapshot.get(section, {}).items():
+                totals[name] = totals.get(name, 0) + value
+        combined[section] = totals
+    
+    for snapshot in snapshots.values():
+        for stage, summary in snapshot.get('timings', {}).items():
+            timing = combined['timings'].setdefault(stage, {'count': 0, 'total': 0.0})
+            timing['count'] += summary.get('count', 0)
+            timing['total'] += summary.get('total', 0.0)
+            for key in ('p50', 'p90', 'p99', 'max'):
+                timing[key] = max(timing.get(key, 0.0), summary.get(key, 0.0))
+    for timing in combined['timings'].values():
+        timing['mean'] = timing['total'] / timing['count'] if timing['count'] else 0.0
+    return combined
+
+def scraper_summary(metrics):
+    """Headline figures from a scraper metrics snapshot for the dashboard card"""
+    if not metrics:
+        return None
+    
+    timings = metrics.get('timings', {})
+    
+    def p90_ms(stage):
+        return f"{timings.get(stage, {}).get('p90', 0) * 1000:.0f}"
+    
+    throughput = metrics.get('throughput', {})
+    queues = metrics.get('queues', {})
+    return {
+        'shards': len(metrics.get('shards', {})),
+        'pages_per_sec': f"{throughput.get('recent_pages_per_sec', 0):.1f}",
+        'kb_per_sec': f"{throughput.get('recent_bytes_per_sec', 0) / 1024:.0f}",
+        'fetch_p90': p90_ms('fetch'),
+        'parse_p90': p90_ms('extract_article_html'),
+        'db_p90': p90_ms('db_batch'),
+        'queued': queues.get('frontier_ready', 0) + queues.get('frontier_delayed', 0),
+        'parse_waiting': queues.get('parse_waiting', 0),
+        'write_queue': queues.get('write_queue', 0),
+        'errors': sum(metrics.get('errors', {}).values()),
+        'updated': metrics.get('timestamp', '')[:19].replace('T', ' '),
+    }
+
+@app.route('/api/scraper-metrics')
+def scraper_metrics():
+    """Raw scraper metrics snapshot as JSON (combined across shards for a sharded crawl)"""
+    return load_scraper_metrics() or {}
+
 if __name__ == '__main__':
     print("🚀 Starting FuelTheAura AI Dashboard...")
     print("📊 Dashboard will be available at: http://your-droplet-ip:8080")
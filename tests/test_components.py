@@ -0,0 +1,133 @@
+"""
+Tests for the scraper's self-contained building blocks
+"""
+
+import random
+import re
+import sqlite3
+
+import pytest
+
+from MASS_SCRAPING_IMPLEMENTATION import ContentStore, DuplicateIndex, PatternMatcher, zstandard
+
+
+def findall_hits(patterns, text):
+    """What scanning each pattern on its own with re.finditer gives, in PatternMatcher.scan's shape"""
+    hits = {}
+    for pattern in dict.fromkeys(patterns):
+        regex = re.compile(pattern)
+        found = [(match.start(), match.group(1) if regex.groups else match.group()) for match in regex.finditer(text)]
+        if found:
+            hits[pattern] = found
+    return hits
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_pattern_matcher_agrees_with_per_pattern_findall(seed):
+    rng = random.Random(seed)
+    for _ in range(200):
+        # A small alphabet makes literals overlap, nest and share prefixes
+        literals = [''.join(rng.choice('ab -') for _ in range(rng.randint(1, 4))) for _ in range(rng.randint(1, 8))]
+        expressions = rng.sample([r'a+b', r'(\d+) b', r'b\s?a', r'\ba\b'], rng.randint(0, 2))
+        patterns = literals + expressions
+        text = ''.join(rng.choice('ab -1') for _ in range(rng.randint(0, 60)))
+        assert PatternMatcher(patterns).scan(text) == findall_hits(patterns, text), (patterns, text)
+
+
+def test_pattern_matcher_on_analysis_patterns():
+    patterns = ['proven', 'proven results', 'results', 'sign up', 'sign', r'(\d+) readers']
+    text = 'Proven results: sign up today - proven results for 2000 readers who sign up'.lower()
+    assert PatternMatcher(patterns).scan(text) == findall_hits(patterns, text)
+
+
+def flip(simhash, *bits):
+    for bit in bits:
+        simhash ^= 1 << bit
+    return simhash
+
+
+BASE_SIMHASH = 0x0123456789ABCDEF
+
+
+@pytest.mark.parametrize('bits', [(), (5,), (5, 21), (5, 21, 40), (0, 1, 2), (63, 62, 47)])
+def test_duplicate_index_finds_simhashes_within_max_distance(bits):
+    index = DuplicateIndex(max_distance=3)
+    index.add('http://a.example/original', 'hash-a', BASE_SIMHASH)
+    match = index.find('http://b.example/copy', 'hash-b', flip(BASE_SIMHASH, *bits))
+    assert match == ('http://a.example/original', len(bits))
+
+
+@pytest.mark.parametrize('bits', [(5, 21, 40, 60), (0, 1, 2, 3)], ids=['one-per-band', 'one-band'])
+def test_duplicate_index_ignores_simhashes_beyond_max_distance(bits):
+    index = DuplicateIndex(max_distance=3)
+    index.add('http://a.example/original', 'hash-a', BASE_SIMHASH)
+    assert index.find('http://b.example/copy', 'hash-b', flip(BASE_SIMHASH, *bits)) is None
+
+
+def test_duplicate_index_exact_matches_replacements_and_removal():
+    index = DuplicateIndex(max_distance=2)
+    index.add('http://a.example/1', 'same', None)
+    assert index.find('http://b.example/1', 'same', None) == ('http://a.example/1', 0)
+    assert index.find('http://a.example/1', 'same', BASE_SIMHASH) is None
+    
+    index.add('http://a.example/2', 'other', BASE_SIMHASH)
+    assert index.find('http://b.example/2', 'new', flip(BASE_SIMHASH, 9, 30)) == ('http://a.example/2', 2)
+    assert index.find('http://b.example/2', 'new', flip(BASE_SIMHASH, 9, 30, 50)) is None
+    
+    # A new fingerprint replaces the old one in every band
+    index.add('http://a.example/2', 'changed', ~BASE_SIMHASH & 0xFFFFFFFFFFFFFFFF)
+    assert index.find('http://b.example/2', 'new', flip(BASE_SIMHASH, 9)) is None
+    
+    index.remove('http://a.example/1')
+    assert index.find('http://b.example/1', 'same', None) is None
+    assert 'http://a.example/1' not in index.fingerprints
+
+
+def sample_bodies(count, seed=0):
+    """Article-like bodies sharing boilerplate phrases, as a dictionary is trained on"""
+    rng = random.Random(seed)
+    topics = ['sleep', 'energy', 'nutrition', 'stress', 'exercise', 'hydration', 'focus', 'recovery']
+    bodies = []
+    for i in range(count):
+        topic = rng.choice(topics)
+        sentences = [
+            f"Research on {topic} suggests small daily habits add up over time.",
+            f"Our editors reviewed {rng.randint(3, 40)} studies about {topic} and {rng.choice(topics)}.",
+            "Subscribe to our newsletter for weekly health tips from certified experts.",
+            f"Article {i}: {' '.join(rng.choice(topics) for _ in range(rng.randint(5, 30)))}.",
+        ]
+        bodies.append(' '.join(rng.sample(sentences, len(sentences))))
+    return bodies
+
+
+@pytest.mark.parametrize('codec', [
+    pytest.param('zstd', marks=pytest.mark.skipif(zstandard is None, reason='zstandard is not installed')),
+    'zlib',
+])
+def test_content_store_round_trips_bodies_across_dictionaries(codec):
+    conn = sqlite3.connect(':memory:')
+    store = ContentStore(codec=codec)
+    store.setup_tables(conn.cursor())
+    bodies = sample_bodies(300)
+    
+    # Bodies written before and after training each decompress with their own dictionary
+    store.write(conn.cursor(), 1, bodies[0])
+    dictionary_id = store.train(conn, bodies[10:], dict_size=16 * 1024)
+    store.write(conn.cursor(), 2, bodies[1])
+    store.write(conn.cursor(), 3, 'Ünïcode body – with “quotes” and emoji 🌙')
+    conn.commit()
+    
+    rows = dict(conn.execute('SELECT article_id, dictionary_id FROM article_bodies'))
+    assert rows == {1: None, 2: dictionary_id, 3: dictionary_id}
+    assert store.read(conn, 4) is None
+    
+    # A fresh store, as in another process, loads the dictionary from the database
+    reader = ContentStore(codec=codec)
+    reader.load(conn)
+    assert reader.dictionary_id == dictionary_id
+    assert [reader.read(conn, article_id) for article_id in (1, 2, 3)] == \
+        [bodies[0], bodies[1], 'Ünïcode body – with “quotes” and emoji 🌙']
+    
+    # The dictionary earns its keep on bodies like the ones it was trained on
+    plain = ContentStore(codec=codec)
+    assert len(store.compress(bodies[2])[1]) < len(plain.compress(bodies[2])[1])
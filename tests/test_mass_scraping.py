@@ -0,0 +1,524 @@
+"""
+Crawl tests against a small aiohttp site served on localhost
+"""
+
+import asyncio
+import gzip
+import sqlite3
+import time
+
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit
+
+import pytest
+from aiohttp import web
+
+from MASS_SCRAPING_IMPLEMENTATION import CrawlFrontier, HealthContentScraper, ReplayServer, ResponseArchive
+
+# /blog/2, /blog/4 and /blog/5 are only linked from other articles
+SITE_LINKS = {
+    '/': ['/blog/0', '/blog/1', '/section/a'],
+    '/section/a': ['/blog/3'],
+    '/blog/0': ['/blog/2'],
+    '/blog/1': [],
+    '/blog/2': ['/blog/4'],
+    '/blog/3': [],
+    '/blog/4': ['/blog/5'],
+    '/blog/5': [],
+}
+
+
+async def start_site(handle):
+    """Serve every GET with handle on a free localhost port; returns (runner, base url)"""
+    app = web.Application()
+    app.router.add_get('/{tail:.*}', handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    return runner, f'http://127.0.0.1:{runner.addresses[0][1]}/'
+
+
+def site_page(path):
+    links = ''.join(f'<a href="{link}">more</a>' for link in SITE_LINKS[path])
+    if path.startswith('/blog/'):
+        body = f'<article><h1>Article {path}</h1><p>Health text about {path}, sleep and energy.</p>{links}</article>'
+    else:
+        body = links
+    return f'<html><body>{body}</body></html>'
+
+
+async def serve_site(requested, use_etags):
+    """Serve SITE_LINKS, recording every requested path; returns (runner, base url)"""
+    async def handle(request):
+        path = request.path
+        if path == '/robots.txt':
+            return web.Response(status=404)
+        requested.append(path)
+        if path not in SITE_LINKS:
+            return web.Response(status=404)
+        
+        etag = f'"{path}"'
+        if use_etags and request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304, headers={'ETag': etag})
+        headers = {'ETag': etag} if use_etags else {}
+        return web.Response(text=site_page(path), content_type='text/html', headers=headers)
+    
+    return await start_site(handle)
+
+
+async def crawl(db_path, base_url, retry_failures=False, **options):
+    """Run one crawl of base_url into db_path; returns the scraper"""
+    options = dict({'host_delay': 0, 'max_host_rate': 1000, 'parse_processes': 0, 'discovery': 'links',
+                    'max_depth': 6}, **options)
+    scraper = HealthContentScraper(db_path=str(db_path), **options)
+    scraper.target_sites = [base_url]
+    await scraper.run_mass_scraping(retry_failures=retry_failures)
+    return scraper
+
+
+def crawl_outcomes(db_path):
+    """URL path -> (frontier status, failure ledger error) after a crawl"""
+    conn = sqlite3.connect(db_path)
+    try:
+        return {
+            urlsplit(url).path: (status, error)
+            for url, status, error in conn.execute('''
+                SELECT f.url, f.status, c.last_error
+                FROM crawl_frontier f LEFT JOIN crawl_failures c ON c.url = f.url
+            ''')
+        }
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize('use_etags, forget_links', [(True, False), (False, False), (True, True)],
+                         ids=['304', 'identical-200', '304-without-stored-links'])
+def test_recrawl_of_unchanged_site_reaches_same_urls(tmp_path, monkeypatch, use_etags, forget_links):
+    monkeypatch.chdir(tmp_path)
+    
+    async def run():
+        requested = []
+        runner, base_url = await serve_site(requested, use_etags)
+        try:
+            await crawl(tmp_path / 'crawl.db', base_url)
+            first = set(requested)
+            requested.clear()
+            if forget_links:
+                # Databases from before article_links was kept
+                conn = sqlite3.connect(tmp_path / 'crawl.db')
+                conn.execute('DELETE FROM article_links')
+                conn.commit()
+                conn.close()
+            await crawl(tmp_path / 'crawl.db', base_url)
+            return first, set(requested)
+        finally:
+            await runner.cleanup()
+    
+    first, second = asyncio.run(run())
+    assert first == set(SITE_LINKS)
+    assert second == first
+
+
+PAGE_LIMIT = 4096
+
+
+async def serve_faulty_site():
+    """A site whose pages hit the size cap, arrive cut off, or are not HTML; returns (runner, base url)"""
+    article = '<html><body><article><h1>Sleep</h1><p>Health text about sleep.</p></article></body></html>'
+    
+    async def handle(request):
+        path = request.path
+        if path == '/':
+            links = ['/blog/ok', '/blog/big', '/blog/streamed-big', '/blog/cut', '/blog/file', '/blog/missing']
+            body = ''.join(f'<a href="{link}">more</a>' for link in links)
+            return web.Response(text=f'<html><body>{body}</body></html>', content_type='text/html')
+        if path == '/blog/ok':
+            return web.Response(text=article, content_type='text/html')
+        if path == '/blog/big':
+            return web.Response(text=article + 'x' * PAGE_LIMIT, content_type='text/html')
+        if path == '/blog/file':
+            return web.Response(body=b'%PDF-1.4' * 100, content_type='application/pdf')
+        
+        response = web.StreamResponse(headers={'Content-Type': 'text/html'})
+        if path == '/blog/streamed-big':
+            response.enable_chunked_encoding()
+            await response.prepare(request)
+            for _ in range(4):
+                await response.write(b'x' * PAGE_LIMIT)
+            await response.write_eof()
+            return response
+        if path == '/blog/cut':
+            response.content_length = 3 * PAGE_LIMIT // 4
+            await response.prepare(request)
+            await response.write(article.encode())
+            request.transport.close()
+            return response
+        return web.Response(status=404)
+    
+    return await start_site(handle)
+
+
+@pytest.mark.parametrize('parse_processes', [0, 2], ids=['inline', 'parse-pool'])
+def test_replay_reproduces_recorded_outcomes(tmp_path, monkeypatch, parse_processes):
+    monkeypatch.chdir(tmp_path)
+    archive_path = str(tmp_path / 'crawl.warc.gz')
+    options = {'max_page_bytes': PAGE_LIMIT, 'max_retries': 0, 'parse_processes': parse_processes}
+    
+    async def run():
+        runner, base_url = await serve_faulty_site()
+        try:
+            await crawl(tmp_path / 'recorded.db', base_url, record_path=archive_path, **options)
+        finally:
+            await runner.cleanup()
+        
+        archive = ResponseArchive(archive_path)
+        archive.load()
+        server = ReplayServer(archive)
+        replay_url = await server.start()
+        try:
+            await crawl(tmp_path / 'replayed.db', base_url, replay_url=replay_url, **options)
+        finally:
+            await server.stop()
+    
+    asyncio.run(run())
+    recorded = crawl_outcomes(tmp_path / 'recorded.db')
+    assert recorded['/blog/ok'][0] == 'done'
+    for path in ('/blog/big', '/blog/streamed-big', '/blog/cut', '/blog/file', '/blog/missing'):
+        assert recorded[path][0] == 'failed', path
+    assert crawl_outcomes(tmp_path / 'replayed.db') == recorded
+
+
+async def write_in_chunks(request, text, chunk_size=8192):
+    """Stream text as a chunked text/plain response, one network write per chunk"""
+    response = web.StreamResponse(headers={'Content-Type': 'text/plain'})
+    response.enable_chunked_encoding()
+    await response.prepare(request)
+    data = text.encode()
+    for start in range(0, len(data), chunk_size):
+        await response.write(data[start:start + chunk_size])
+        await asyncio.sleep(0.01)
+    await response.write_eof()
+    return response
+
+
+def test_robots_txt_is_read_past_the_first_chunk(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    requested = []
+    
+    async def handle(request):
+        path = request.path
+        requested.append(path)
+        if path == '/robots.txt':
+            # About 62 KB of rules, with the ones that matter at the end
+            rules = ''.join(f'Disallow: /private/{i:05d}\n' for i in range(2500))
+            sitemap = f'http://{request.host}/maps/articles.xml'
+            return await write_in_chunks(request, f'User-agent: *\n{rules}Disallow: /blog/secret\nSitemap: {sitemap}\n')
+        if path == '/maps/articles.xml':
+            return web.Response(status=404)
+        links = '<a href="/blog/secret">secret</a><a href="/blog/open">open</a>'
+        return web.Response(text=f'<html><body><article><h1>{path}</h1>{links}</article></body></html>',
+                            content_type='text/html')
+    
+    async def run():
+        runner, base_url = await start_site(handle)
+        try:
+            return await crawl(tmp_path / 'crawl.db', base_url, discovery='both')
+        finally:
+            await runner.cleanup()
+    
+    scraper = asyncio.run(run())
+    assert '/blog/open' in requested
+    assert '/blog/secret' not in requested
+    assert '/maps/articles.xml' in requested
+    host = urlsplit(scraper.target_sites[0]).netloc
+    assert scraper.robots[host][0].site_maps() == [f'http://{host}/maps/articles.xml']
+
+
+@pytest.mark.parametrize('failure', [503, 429, 'disconnect'])
+def test_unavailable_robots_txt_holds_the_host_until_it_can_be_read(tmp_path, monkeypatch, failure):
+    monkeypatch.chdir(tmp_path)
+    requested = []
+    robots_failures = [failure, failure]
+    
+    async def handle(request):
+        path = request.path
+        requested.append(path)
+        if path == '/robots.txt':
+            if robots_failures:
+                robots_failures.pop()
+                if failure == 'disconnect':
+                    request.transport.close()
+                    return web.Response()
+                return web.Response(status=failure)
+            return web.Response(text='User-agent: *\nDisallow: /blog/secret\n')
+        links = '<a href="/blog/secret">secret</a><a href="/blog/open">open</a>'
+        return web.Response(text=f'<html><body><article><h1>{path}</h1>{links}</article></body></html>',
+                            content_type='text/html')
+    
+    async def run():
+        runner, base_url = await start_site(handle)
+        try:
+            scraper = HealthContentScraper(db_path=str(tmp_path / 'crawl.db'), host_delay=0, max_host_rate=1000,
+                                           parse_processes=0, discovery='links', max_retries=5, retry_backoff=0.01)
+            scraper.robots_error_ttl = 0.2
+            scraper.target_sites = [base_url]
+            await scraper.run_mass_scraping()
+        finally:
+            await runner.cleanup()
+    
+    asyncio.run(run())
+    # Nothing but robots.txt is fetched until it has been read
+    assert requested[:3] == ['/robots.txt'] * 3
+    assert '/blog/open' in requested
+    assert '/blog/secret' not in requested
+
+
+def test_missing_robots_txt_allows_everything(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    requested = []
+    
+    async def handle(request):
+        requested.append(request.path)
+        if request.path == '/robots.txt':
+            return web.Response(status=404)
+        return web.Response(text='<html><body><a href="/blog/secret">secret</a></body></html>',
+                            content_type='text/html')
+    
+    async def run():
+        runner, base_url = await start_site(handle)
+        try:
+            await crawl(tmp_path / 'crawl.db', base_url)
+        finally:
+            await runner.cleanup()
+    
+    asyncio.run(run())
+    assert requested.count('/robots.txt') == 1
+    assert '/blog/secret' in requested
+
+
+def article_text(topic):
+    """A body long enough for SimHash matching, distinct per topic"""
+    words = ' '.join(f'{topic}{i}' for i in range(60))
+    return f'<html><body><article><h1>About {topic}</h1><p>{words}</p></article></body></html>'
+
+
+def stored_kinds(db_path):
+    """URL path -> 'article' or ('duplicate', canonical path)"""
+    conn = sqlite3.connect(db_path)
+    try:
+        kinds = {urlsplit(url).path: 'article' for url, in conn.execute('SELECT url FROM articles')}
+        for url, canonical in conn.execute('SELECT url, canonical_url FROM article_duplicates'):
+            assert urlsplit(url).path not in kinds
+            kinds[urlsplit(url).path] = ('duplicate', urlsplit(canonical).path)
+        return kinds
+    finally:
+        conn.close()
+
+
+async def serve_articles(bodies):
+    """Serve '/' linking to every path in bodies, and each path with the text of its current topic"""
+    async def handle(request):
+        if request.path == '/':
+            links = ''.join(f'<a href="{path}">more</a>' for path in bodies)
+            return web.Response(text=f'<html><body>{links}</body></html>', content_type='text/html')
+        if request.path in bodies:
+            return web.Response(text=article_text(bodies[request.path]), content_type='text/html')
+        return web.Response(status=404)
+    
+    return await start_site(handle)
+
+
+def test_duplicates_are_rechecked_when_their_canonical_changes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    db_path = tmp_path / 'crawl.db'
+    bodies = {'/blog/a': 'sleep', '/blog/b': 'sleep'}
+    
+    async def run():
+        runner, base_url = await serve_articles(bodies)
+        try:
+            await crawl(db_path, base_url)
+            kinds = stored_kinds(db_path)
+            canonical = next(path for path, kind in kinds.items() if kind == 'article')
+            bodies[canonical] = 'energy'
+            await crawl(db_path, base_url)
+        finally:
+            await runner.cleanup()
+        return kinds
+    
+    first = asyncio.run(run())
+    assert first in ({'/blog/a': 'article', '/blog/b': ('duplicate', '/blog/a')},
+                     {'/blog/a': ('duplicate', '/blog/b'), '/blog/b': 'article'})
+    assert stored_kinds(db_path) == {'/blog/a': 'article', '/blog/b': 'article'}
+
+
+def test_article_that_becomes_a_duplicate_loses_its_article_rows(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    db_path = tmp_path / 'crawl.db'
+    bodies = {'/blog/a': 'sleep', '/blog/b': 'energy'}
+    
+    async def run():
+        runner, base_url = await serve_articles(bodies)
+        try:
+            await crawl(db_path, base_url)
+            bodies['/blog/b'] = 'sleep'
+            await crawl(db_path, base_url)
+        finally:
+            await runner.cleanup()
+    
+    asyncio.run(run())
+    assert stored_kinds(db_path) == {'/blog/a': 'article', '/blog/b': ('duplicate', '/blog/a')}
+    conn = sqlite3.connect(db_path)
+    try:
+        article_id, = conn.execute("SELECT id FROM articles WHERE url LIKE '%/blog/a'").fetchone()
+        for table in ('article_bodies', 'headlines', 'keywords'):
+            assert {row[0] for row in conn.execute(f'SELECT DISTINCT article_id FROM {table}')} == {article_id}
+        assert conn.execute('SELECT COUNT(*) FROM content_fingerprints').fetchone()[0] == 1
+        assert conn.execute("SELECT COUNT(*) FROM term_stats WHERE term LIKE 'energy%'").fetchone()[0] == 0
+    finally:
+        conn.close()
+
+
+def test_handoffs_only_rerun_keeps_the_urls_already_crawled(tmp_path):
+    db_path = str(tmp_path / 'crawl.db')
+    
+    async def first_crawl():
+        frontier = CrawlFrontier(db_path=db_path)
+        for path in ('/blog/0', '/blog/1'):
+            await frontier.put(f'http://example.com{path}')
+        while (item := await frontier.get()) is not None:
+            await frontier.task_done(item[0])
+        frontier.close()
+    
+    async def rerun(continue_crawl):
+        frontier = CrawlFrontier(db_path=db_path)
+        assert frontier.load(continue_crawl=continue_crawl) == 0
+        queued = [await frontier.put(f'http://example.com{path}') for path in ('/blog/0', '/blog/2')]
+        while (item := await frontier.get()) is not None:
+            await frontier.task_done(item[0])
+        frontier.close()
+        return queued
+    
+    asyncio.run(first_crawl())
+    assert asyncio.run(rerun(continue_crawl=True)) == [False, True]
+    # A full crawl after one that ran to completion starts a fresh pass
+    assert asyncio.run(rerun(continue_crawl=False)) == [True, True]
+
+
+def failure_ledger(db_path):
+    """URL path -> (attempts, last status, retryable) from the failure ledger"""
+    conn = sqlite3.connect(db_path)
+    try:
+        return {
+            urlsplit(url).path: (attempts, status, bool(retryable))
+            for url, attempts, status, retryable in conn.execute(
+                'SELECT url, attempts, last_status, retryable FROM crawl_failures'
+            )
+        }
+    finally:
+        conn.close()
+
+
+def test_fetch_failures_are_retried_by_class_and_recorded_in_the_ledger(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    db_path = tmp_path / 'crawl.db'
+    requested = {}
+    healthy = set()
+    article = '<html><body><article><h1>Sleep</h1><p>Health text about sleep.</p></article></body></html>'
+    
+    async def handle(request):
+        path = request.path
+        requested.setdefault(path, []).append(time.monotonic())
+        if path == '/robots.txt':
+            return web.Response(status=404)
+        if path == '/':
+            links = ''.join(f'<a href="{link}">more</a>' for link in ('/blog/missing', '/blog/down', '/blog/busy'))
+            return web.Response(text=f'<html><body>{links}</body></html>', content_type='text/html')
+        if path == '/blog/down' and path not in healthy:
+            return web.Response(status=503)
+        if path == '/blog/busy' and len(requested[path]) == 1:
+            return web.Response(status=429, headers={'Retry-After': '1'})
+        if path in ('/blog/down', '/blog/busy'):
+            return web.Response(text=article, content_type='text/html')
+        return web.Response(status=404)
+    
+    async def run():
+        runner, base_url = await start_site(handle)
+        try:
+            await crawl(db_path, base_url, max_retries=2, retry_backoff=0.01)
+            first = dict(requested)
+            ledger = failure_ledger(db_path)
+            
+            # A retry pass only fetches the ledger's retryable URLs
+            requested.clear()
+            healthy.add('/blog/down')
+            await crawl(db_path, base_url, max_retries=2, retry_backoff=0.01, retry_failures=True)
+            return first, ledger
+        finally:
+            await runner.cleanup()
+    
+    first, ledger = asyncio.run(run())
+    assert len(first['/blog/missing']) == 1
+    assert len(first['/blog/down']) == 3
+    assert len(first['/blog/busy']) == 2
+    # The 429's Retry-After holds the host, not just the retry backoff
+    assert first['/blog/busy'][1] - first['/blog/busy'][0] >= 0.9
+    assert ledger == {'/blog/missing': (1, 404, False), '/blog/down': (3, 503, True)}
+    assert set(requested) - {'/robots.txt'} == {'/blog/down'}
+    assert failure_ledger(db_path) == {'/blog/missing': (1, 404, False)}
+
+
+def sitemap_xml(root, entries):
+    """A urlset or sitemapindex listing (loc, lastmod) entries"""
+    tag = 'url' if root == 'urlset' else 'sitemap'
+    items = ''.join(
+        f'<{tag}><loc>{loc}</loc>{f"<lastmod>{lastmod}</lastmod>" if lastmod else ""}</{tag}>'
+        for loc, lastmod in entries
+    )
+    return f'<?xml version="1.0"?><{root} xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{items}</{root}>'
+
+
+def test_sitemap_index_with_gzipped_child_queues_only_new_or_updated_articles(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    db_path = tmp_path / 'crawl.db'
+    requested = []
+    lastmods = {'/blog/old': '2020-01-01', '/blog/updated': '2020-01-01T08:00:00Z', '/blog/undated': None}
+    
+    async def handle(request):
+        path = request.path
+        requested.append(path)
+        base = f'http://{request.host}'
+        if path == '/robots.txt':
+            return web.Response(text=f'User-agent: *\nSitemap: {base}/sitemap_index.xml\n')
+        if path == '/sitemap_index.xml':
+            children = [(f'{base}/maps/old.xml.gz', '2020-01-01'), (f'{base}/maps/new.xml', None)]
+            return web.Response(text=sitemap_xml('sitemapindex', children), content_type='application/xml')
+        if path == '/maps/old.xml.gz':
+            entries = [(base + loc, lastmods[loc]) for loc in ('/blog/old', '/blog/updated')]
+            # Served as a file, so aiohttp leaves it compressed
+            return web.Response(body=gzip.compress(sitemap_xml('urlset', entries).encode()),
+                                content_type='application/octet-stream')
+        if path == '/maps/new.xml':
+            return web.Response(text=sitemap_xml('urlset', [(base + '/blog/undated', None)]),
+                                content_type='application/xml')
+        if path in lastmods:
+            return web.Response(text=article_text(path.rsplit('/', 1)[1]), content_type='text/html')
+        return web.Response(status=404)
+    
+    async def run():
+        runner, base_url = await start_site(handle)
+        try:
+            await crawl(db_path, base_url, discovery='sitemap')
+            first = set(requested)
+            requested.clear()
+            lastmods['/blog/updated'] = (datetime.now(timezone.utc) + timedelta(days=1)).isoformat()
+            await crawl(db_path, base_url, discovery='sitemap')
+            return first
+        finally:
+            await runner.cleanup()
+    
+    first = asyncio.run(run())
+    sitemaps = {'/robots.txt', '/sitemap_index.xml', '/maps/old.xml.gz', '/maps/new.xml'}
+    assert first == sitemaps | set(lastmods)
+    assert set(requested) == sitemaps | {'/blog/updated'}
+    assert set(stored_kinds(db_path)) == set(lastmods)